@@ -9,12 +9,13 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer
 from sqlalchemy.orm import Session
 from ..database import get_db
-from ..auth import auth_manager, get_current_user
+from ..auth import auth_manager, get_current_user, invalidate_user_cache
 from ..models.user import (
     User, UserCreate, UserLogin, UserResponse, 
     UserLoginResponse, UserSessionCreate
 )
 from ..cache import set_cache, get_cache, delete_cache
+from ..config import settings
 
 router = APIRouter(prefix="/auth", tags=["认证"])
 
@@ -63,7 +64,6 @@ async def register(
     
     db.add(new_user)
     db.commit()
-    db.refresh(new_user)
     
     return UserResponse(
         id=str(new_user.id),
@@ -158,7 +158,7 @@ async def login(
     
     print(f"=== 缓存用户信息 ===")
     # 缓存用户信息
-    cache_key = f"user:{user.id}"
+    cache_key = f"{settings.CACHE_PREFIX}user_info:{user.id}"
     user_info = {
         "id": str(user.id),
         "username": user.username,
@@ -340,7 +340,9 @@ async def update_current_user_info(
     current_user.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(current_user)
+    # updated_at最终由BEFORE UPDATE触发器写入，只回读该列，避免返回应用侧的时间
+    db.refresh(current_user, ["updated_at"])
+    invalidate_user_cache(current_user.id)
     
     return UserResponse(
         id=str(current_user.id),
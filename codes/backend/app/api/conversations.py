@@ -3,12 +3,18 @@
 处理对话会话和消息管理
 """
 
+import uuid
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import func, insert, literal, literal_column, select, update
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
+from ..database import get_db, get_db_context
+from ..config import settings
 from ..auth import get_current_user
+from ..cache import get_cache, set_cache, delete_cache
 from ..models.user import User
 from ..models.conversation import (
     Conversation, Message, ConversationCreate, ConversationUpdate, ConversationResponse,
@@ -17,18 +23,233 @@ from ..models.conversation import (
 )
 from ..modules.conversation import ConversationManager, ConversationInput, ConversationOutput
 from ..services.rag_service import get_rag_service
+from ..utils.db_logger import db_logger
+from ..utils.etag import build_etag, is_not_modified, not_modified_response
 import httpx
 import asyncio
+import json
 import logging
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/conversations", tags=["对话"])
+router = APIRouter(prefix="/conversations", tags=["对话"], default_response_class=ORJSONResponse)
 
 # 创建对话管理器实例
 conversation_manager = ConversationManager()
 
+# 对话归属校验结果的缓存时间（秒）
+CONVERSATION_OWNER_CACHE_TTL = 60
+
+
+def _conversation_owner_cache_key(user_id, conversation_id: str) -> str:
+    """对话归属校验的缓存键"""
+    return f"{settings.CACHE_PREFIX}conversation_owner:{user_id}:{conversation_id}"
+
+
+async def verify_conversation_owner(
+    conversation_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> str:
+    """
+    校验对话存在且属于当前用户
+    
+    只执行 SELECT 1 而不加载对话对象，校验通过后在Redis中短期缓存，
+    供仅需鉴权的接口通过 Depends 注入
+    """
+    cache_key = _conversation_owner_cache_key(current_user.id, conversation_id)
+    if get_cache(cache_key):
+        return conversation_id
+    
+    owned = db.execute(
+        select(literal(1)).select_from(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        ).limit(1)
+    ).scalar()
+    
+    if not owned:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="对话不存在"
+        )
+    
+    set_cache(cache_key, "1", expire=CONVERSATION_OWNER_CACHE_TTL)
+    return conversation_id
+
+
+def _message_count_column():
+    """
+    对话消息数的关联标量子查询
+    
+    随对话一并查出消息数，避免为了计数加载整个messages集合；
+    conversations.message_count由触发器维护，但ORM模型尚未映射该列，读取接口仍按消息实时计数
+    """
+    return (
+        select(func.count(Message.id))
+        .where(Message.conversation_id == Conversation.id)
+        .correlate(Conversation)
+        .scalar_subquery()
+        .label("message_count")
+    )
+
+
+def _read_back_after_insert(db: Session, conversation_id):
+    """
+    读取本次写入消息后由触发器更新的updated_at和message_count
+    
+    messages上的AFTER INSERT触发器在同一事务内UPDATE conversations递增message_count，
+    该UPDATE同时触发update_updated_at_column刷新updated_at，并锁住对话行直到提交，
+    提交前读到的就是本次写入后的值，并发发送时也不会与其他请求的计数混淆；
+    message_count尚未在ORM模型中映射，按列名读取
+    
+    Returns:
+        Row: (updated_at, message_count)
+    """
+    return db.execute(
+        select(Conversation.updated_at, literal_column("message_count"))
+        .where(Conversation.id == conversation_id)
+    ).one()
+
+
+def _conversation_to_dict(conversation: Conversation, message_count: int) -> dict:
+    """将对话行直接转换为响应字典，列表接口据此跳过响应模型的二次校验"""
+    return {
+        "id": str(conversation.id),
+        "user_id": str(conversation.user_id),
+        "title": conversation.title,
+        "status": conversation.status,
+        "conversation_type": conversation.conversation_type,
+        "meta_data": conversation.meta_data,
+        "created_at": conversation.created_at,
+        "updated_at": conversation.updated_at,
+        "message_count": message_count
+    }
+
+
+def _message_to_dict(message: Message) -> dict:
+    """将消息行直接转换为响应字典，列表接口据此跳过响应模型的二次校验"""
+    return {
+        "id": str(message.id),
+        "conversation_id": str(message.conversation_id),
+        "role": message.role,
+        "content": message.content,
+        "content_type": message.content_type,
+        "message_data": message.message_data,
+        "is_processed": message.is_processed,
+        "created_at": message.created_at
+    }
+
+
+def _touch_conversation(db: Session, conversation_id, **values) -> datetime:
+    """
+    由数据库用now()刷新对话的updated_at，并通过RETURNING取回该值
+    
+    时间戳与UPDATE在同一条语句中生成，避免各worker的时钟偏差和额外的回读；
+    values中的其他字段随同一条UPDATE写入
+    """
+    return db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(**values, updated_at=func.now())
+        .returning(Conversation.updated_at)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+
+
+def _messages_fingerprint(db: Session, conversation_id) -> tuple:
+    """消息只增删不修改，用max(created_at)和记录数作为对话消息的数据指纹"""
+    return db.query(
+        func.max(Message.created_at), func.count(Message.id)
+    ).filter(Message.conversation_id == conversation_id).one()
+
+
+def _insert_message_pair(db: Session, user_values: dict, ai_values: dict) -> List[dict]:
+    """
+    用一条多行INSERT ... RETURNING写入用户消息和AI回复
+    
+    Returns:
+        补全了数据库生成的id和created_at的两条消息字段，顺序与传入一致
+    """
+    rows = db.execute(
+        insert(Message).returning(Message.id, Message.created_at, sort_by_parameter_order=True),
+        [user_values, ai_values]
+    ).all()
+    return [
+        {**values, "id": row.id, "created_at": row.created_at}
+        for values, row in zip((user_values, ai_values), rows)
+    ]
+
+
+def _build_message_response(values: dict) -> MessageResponse:
+    """根据新写入消息的字段构建消息响应"""
+    return MessageResponse(
+        id=str(values["id"]),
+        conversation_id=str(values["conversation_id"]),
+        role=values["role"],
+        content=values["content"],
+        content_type=values["content_type"],
+        message_data=values["message_data"],
+        is_processed=False,
+        created_at=values["created_at"]
+    )
+
+
+def _get_recent_messages(db: Session, conversation_id: str, limit: int = 5) -> List[Message]:
+    """
+    获取对话最近的若干条消息（按时间正序），只查询上下文需要的行
+    """
+    messages = db.query(Message).filter(
+        Message.conversation_id == conversation_id
+    ).order_by(Message.created_at.desc()).limit(limit).all()
+    messages.reverse()
+    return messages
+
+
+def _persist_stream_messages(
+    conversation_id: str,
+    user_id,
+    user_message_id: uuid.UUID,
+    user_content: str,
+    content_type: str,
+    ai_message_id: uuid.UUID,
+    ai_content: str,
+    ai_message_data: dict
+):
+    """
+    流式回复结束后的后台落库任务
+    
+    在响应发送完毕后使用独立会话写入用户消息和AI回复，
+    避免数据库提交延迟阻塞最后一个SSE帧
+    """
+    try:
+        with get_db_context() as db:
+            _insert_message_pair(
+                db,
+                dict(
+                    id=user_message_id,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    content=user_content,
+                    content_type=content_type,
+                    role="user",
+                    message_data={}
+                ),
+                dict(
+                    id=ai_message_id,
+                    conversation_id=conversation_id,
+                    user_id=None,  # AI消息没有用户ID
+                    content=ai_content,
+                    content_type="text",
+                    role="assistant",
+                    message_data=ai_message_data
+                )
+            )
+        logger.info(f"✅ 流式消息已保存到数据库: 对话ID={conversation_id}")
+    except Exception as e:
+        logger.error(f"❌ 流式消息保存失败: 对话ID={conversation_id}, 错误: {e}")
+
 
 @router.post("/", response_model=ConversationResponse, summary="创建对话")
 async def create_conversation(
@@ -42,12 +263,10 @@ async def create_conversation(
     - **title**: 对话标题（可选）
     - **status**: 对话状态（默认为active）
     """
-    # 调试信息：打印接收到的数据
-    print(f"🔍 接收到的对话数据: {conversation_data}")
-    print(f"🔍 数据类型: {type(conversation_data)}")
-    print(f"🔍 数据内容: title={conversation_data.title}, conversation_type={conversation_data.conversation_type}")
-    print(f"🔍 用户ID: {current_user.id}")
-    print(f"🔍 用户名: {current_user.username}")
+    logger.debug(
+        "🔍 创建对话 - 用户ID: %s, title=%s, conversation_type=%s",
+        current_user.id, conversation_data.title, conversation_data.conversation_type
+    )
     new_conversation = Conversation(
         user_id=current_user.id,
         title=conversation_data.title,
@@ -58,7 +277,6 @@ async def create_conversation(
     
     db.add(new_conversation)
     db.commit()
-    db.refresh(new_conversation)
     
     return ConversationResponse(
         id=str(new_conversation.id),
@@ -74,6 +292,7 @@ async def create_conversation(
 
 @router.get("/", response_model=List[ConversationResponse], summary="获取对话列表")
 async def get_conversations(
+    request: Request,
     skip: int = Query(0, ge=0, description="跳过记录数"),
     limit: int = Query(20, ge=1, le=100, description="返回记录数"),
     status: Optional[str] = Query(None, description="对话状态过滤"),
@@ -89,32 +308,37 @@ async def get_conversations(
     - **status**: 对话状态过滤（可选）
     - **conversation_type**: 对话类型过滤（可选，如：chat, diagnosis, consultation）
     """
-    query = db.query(Conversation).filter(Conversation.user_id == current_user.id)
+    filters = [Conversation.user_id == current_user.id]
     
     if status:
-        query = query.filter(Conversation.status == status)
+        filters.append(Conversation.status == status)
     
     if conversation_type:
-        query = query.filter(Conversation.conversation_type == conversation_type)
+        filters.append(Conversation.conversation_type == conversation_type)
     
-    conversations = query.order_by(Conversation.updated_at.desc()).offset(skip).limit(limit).all()
+    # 新增消息会通过触发器刷新对话的updated_at，max(updated_at)+记录数即可作为列表指纹
+    last_updated, total = db.query(
+        func.max(Conversation.updated_at), func.count(Conversation.id)
+    ).filter(*filters).one()
+    etag = build_etag(current_user.id, last_updated, total, skip, limit, status, conversation_type)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     
-    print(f"🔍 获取对话列表 - 用户ID: {current_user.id}, 类型过滤: {conversation_type}, 找到: {len(conversations)} 个对话")
+    query = db.query(Conversation, _message_count_column()).options(
+        raiseload(Conversation.messages)
+    ).filter(*filters)
     
-    return [
-        ConversationResponse(
-            id=str(conv.id),
-            user_id=str(conv.user_id),
-            title=conv.title,
-            status=conv.status,
-            conversation_type=conv.conversation_type,
-            meta_data=conv.meta_data,
-            created_at=conv.created_at,
-            updated_at=conv.updated_at,
-            message_count=len(conv.messages)
-        )
-        for conv in conversations
-    ]
+    rows = query.order_by(Conversation.updated_at.desc()).offset(skip).limit(limit).all()
+    
+    logger.debug(
+        "🔍 获取对话列表 - 用户ID: %s, 类型过滤: %s, 找到: %d 个对话",
+        current_user.id, conversation_type, len(rows)
+    )
+    
+    return ORJSONResponse([
+        _conversation_to_dict(conv, message_count)
+        for conv, message_count in rows
+    ], headers={"ETag": etag})
 
 
 @router.get("/{conversation_id}", response_model=ConversationResponse, summary="获取对话详情")
@@ -128,17 +352,21 @@ async def get_conversation(
     
     - **conversation_id**: 对话ID
     """
-    conversation = db.query(Conversation).filter(
+    row = db.query(Conversation, _message_count_column()).options(
+        raiseload(Conversation.messages)
+    ).filter(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
     ).first()
     
-    if not conversation:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在"
         )
     
+    conversation, message_count = row
+    
     return ConversationResponse(
         id=str(conversation.id),
         user_id=str(conversation.user_id),
@@ -148,7 +376,7 @@ async def get_conversation(
         meta_data=conversation.meta_data,
         created_at=conversation.created_at,
         updated_at=conversation.updated_at,
-        message_count=len(conversation.messages)
+        message_count=message_count
     )
 
 
@@ -166,33 +394,41 @@ async def update_conversation(
     - **title**: 新标题
     - **status**: 新状态
     """
-    conversation = db.query(Conversation).filter(
+    row = db.query(Conversation, _message_count_column()).options(
+        raiseload(Conversation.messages)
+    ).filter(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
     ).first()
     
-    if not conversation:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在"
         )
     
+    conversation, message_count = row
+    
+    values = {}
+    
     if conversation_data.title is not None:
-        conversation.title = conversation_data.title
+        values["title"] = conversation_data.title
     
     if conversation_data.status is not None:
-        conversation.status = conversation_data.status
+        values["status"] = conversation_data.status
     
     if conversation_data.conversation_type is not None:
-        conversation.conversation_type = conversation_data.conversation_type
+        values["conversation_type"] = conversation_data.conversation_type
     
     if conversation_data.meta_data is not None:
-        conversation.meta_data = conversation_data.meta_data
+        values["meta_data"] = conversation_data.meta_data
     
-    db.commit()
-    db.refresh(conversation)
+    # 修改的字段与数据库生成的updated_at在同一条UPDATE中写入，RETURNING取回时间戳，无需refresh回读
+    values["updated_at"] = _touch_conversation(db, conversation.id, **values)
+    for key, value in values.items():
+        set_committed_value(conversation, key, value)
     
-    return ConversationResponse(
+    conversation_response = ConversationResponse(
         id=str(conversation.id),
         user_id=str(conversation.user_id),
         title=conversation.title,
@@ -201,8 +437,12 @@ async def update_conversation(
         meta_data=conversation.meta_data,
         created_at=conversation.created_at,
         updated_at=conversation.updated_at,
-        message_count=len(conversation.messages)
+        message_count=message_count
     )
+    
+    db.commit()
+    
+    return conversation_response
 
 
 @router.delete("/{conversation_id}", summary="删除对话")
@@ -229,6 +469,7 @@ async def delete_conversation(
     
     db.delete(conversation)
     db.commit()
+    delete_cache(_conversation_owner_cache_key(current_user.id, conversation_id))
     
     return {"message": "对话已删除"}
 
@@ -247,20 +488,24 @@ async def send_message(
     - **content_type**: 内容类型（默认为text）
     - **message_data**: 元数据（可选）
     """
-    # 获取对话
-    conversation = db.query(Conversation).filter(
+    # 获取对话及其消息数
+    row = db.query(Conversation, _message_count_column()).options(
+        raiseload(Conversation.messages)
+    ).filter(
         Conversation.id == message_data.conversation_id,
         Conversation.user_id == current_user.id
     ).first()
     
-    if not conversation:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在"
         )
     
+    conversation, message_count = row
+    
     # 创建用户消息
-    user_message = Message(
+    user_message = dict(
         conversation_id=message_data.conversation_id,
         user_id=current_user.id,
         content=message_data.content,
@@ -279,7 +524,7 @@ async def send_message(
         
         # 构建对话历史
         conversation_history = []
-        for msg in conversation.messages[-5:]:  # 取最近5条消息作为上下文
+        for msg in _get_recent_messages(db, message_data.conversation_id):  # 取最近5条消息作为上下文
             conversation_history.append({
                 'role': msg.role,
                 'content': msg.content
@@ -333,7 +578,7 @@ async def send_message(
         }
     
     # 创建AI回复消息
-    assistant_message = Message(
+    assistant_message = dict(
         conversation_id=message_data.conversation_id,
         user_id=None,
         content=ai_response,
@@ -342,28 +587,13 @@ async def send_message(
         message_data=rag_metadata
     )
     
-    # 更新对话的 updated_at 时间戳
-    from datetime import datetime
-    conversation.updated_at = datetime.utcnow()
+    # 两条消息一次往返写入，RETURNING回填主键和创建时间；
+    # 触发器随之刷新对话的updated_at和message_count，写入后一次读回
+    user_message, assistant_message = _insert_message_pair(db, user_message, assistant_message)
+    now, message_count = _read_back_after_insert(db, conversation.id)
     
-    db.add(user_message)
-    db.add(assistant_message)
-    db.commit()
-    db.refresh(user_message)
-    db.refresh(assistant_message)
-    db.refresh(conversation)
-    
-    return SendMessageResponse(
-        message=MessageResponse(
-            id=str(user_message.id),
-            conversation_id=str(user_message.conversation_id),
-            role=user_message.role,
-            content=user_message.content,
-            content_type=user_message.content_type,
-            message_data=user_message.message_data,
-            is_processed=user_message.is_processed,
-            created_at=user_message.created_at
-        ),
+    response = SendMessageResponse(
+        message=_build_message_response(user_message),
         conversation=ConversationResponse(
             id=str(conversation.id),
             user_id=str(conversation.user_id),
@@ -372,11 +602,14 @@ async def send_message(
             conversation_type=conversation.conversation_type,
             meta_data=conversation.meta_data,
             created_at=conversation.created_at,
-            updated_at=conversation.updated_at,
-            message_count=len(conversation.messages) + 2
+            updated_at=now,
+            message_count=message_count
         ),
         ai_response=ai_response
     )
+    db.commit()
+    
+    return response
 
 
 @router.post("/{conversation_id}/messages", response_model=SendMessageResponse, summary="发送消息到对话")
@@ -402,19 +635,18 @@ async def send_message_to_conversation(
     # 验证对话存在且属于当前用户
     logger.info(f"🔍 开始验证对话存在性...")
     
-    # 导入数据库日志记录器
-    from ..utils.db_logger import db_logger
-    
     # 记录查询操作
     db_logger.log_query(db, "SELECT", "conversations", 
                        {"id": conversation_id, "user_id": current_user.id})
     
-    conversation = db.query(Conversation).filter(
+    row = db.query(Conversation, _message_count_column()).options(
+        raiseload(Conversation.messages)
+    ).filter(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
     ).first()
     
-    if not conversation:
+    if not row:
         logger.error(f"❌ 对话不存在或不属于当前用户: {conversation_id}")
         logger.error(f"👤 查询用户ID: {current_user.id}")
         raise HTTPException(
@@ -422,13 +654,15 @@ async def send_message_to_conversation(
             detail="对话不存在"
         )
     
+    conversation, message_count = row
+    
     logger.info(f"✅ 对话验证成功: {conversation.title}")
     logger.info(f"📊 对话状态: {conversation.status}")
-    logger.info(f"📈 当前消息数: {len(conversation.messages)}")
+    logger.info(f"📈 当前消息数: {message_count}")
     
     # 创建用户消息
     logger.info(f"📝 开始创建用户消息...")
-    user_message = Message(
+    user_message = dict(
         conversation_id=conversation_id,
         user_id=current_user.id,
         content=message_data.content,
@@ -436,7 +670,7 @@ async def send_message_to_conversation(
         role="user",
         message_data={}
     )
-    logger.info(f"✅ 用户消息创建完成: ID={user_message.id}")
+    logger.info(f"✅ 用户消息创建完成")
     
     # 调用RAG服务生成AI回复
     try:
@@ -450,13 +684,13 @@ async def send_message_to_conversation(
         # 构建对话历史
         logger.info(f"📚 开始构建对话历史...")
         
+        conversation_history = []
+        recent_messages = _get_recent_messages(db, conversation_id)  # 取最近5条消息作为上下文
+        
         # 记录消息查询操作
         db_logger.log_query(db, "SELECT", "messages", 
                            {"conversation_id": conversation_id}, 
-                           len(conversation.messages))
-        
-        conversation_history = []
-        recent_messages = conversation.messages[-5:]  # 取最近5条消息作为上下文
+                           len(recent_messages))
         logger.info(f"📊 获取到 {len(recent_messages)} 条历史消息")
         
         for i, msg in enumerate(recent_messages):
@@ -527,7 +761,7 @@ async def send_message_to_conversation(
     
     # 创建AI回复消息
     logger.info(f"📝 开始创建AI回复消息...")
-    ai_message = Message(
+    ai_message = dict(
         conversation_id=conversation_id,
         user_id=None,
         content=ai_response_content,
@@ -535,65 +769,28 @@ async def send_message_to_conversation(
         role="assistant",
         message_data=rag_metadata
     )
-    logger.info(f"✅ AI回复消息创建完成: ID={ai_message.id}")
-    
-    # 更新对话的 updated_at 时间戳
-    logger.info(f"🕒 更新对话时间戳...")
-    from datetime import datetime
-    conversation.updated_at = datetime.utcnow()
-    logger.info(f"✅ 对话时间戳更新完成: {conversation.updated_at}")
+    logger.info(f"✅ AI回复消息创建完成")
     
     # 保存到数据库
     logger.info(f"💾 开始保存消息到数据库...")
     
-    # 导入数据库日志记录器
-    from ..utils.db_logger import db_logger
-    
-    # 添加用户消息到数据库
-    db_logger.log_insert(db, "messages", 1)
-    db.add(user_message)
-    logger.info(f"📝 用户消息已添加到数据库会话")
-    
-    # 添加AI回复消息到数据库
-    db_logger.log_insert(db, "messages", 1)
-    db.add(ai_message)
-    logger.info(f"🤖 AI回复消息已添加到数据库会话")
-    
-    # 提交事务
-    db_logger.log_commit(db, 2)
-    logger.info(f"💾 开始提交数据库事务...")
-    db.commit()
-    logger.info(f"✅ 数据库事务提交成功")
-    
-    # 刷新数据库对象
-    logger.info(f"🔄 开始刷新数据库对象...")
-    db_logger.log_refresh(db, "messages", 1)
-    db.refresh(user_message)
-    db_logger.log_refresh(db, "messages", 1)
-    db.refresh(ai_message)
-    db_logger.log_refresh(db, "conversations", 1)
-    db.refresh(conversation)
-    logger.info(f"✅ 数据库对象刷新完成")
+    # 用户消息和AI回复一次往返写入，RETURNING回填主键和创建时间；
+    # 触发器随之刷新对话的updated_at和message_count，写入后一次读回
+    db_logger.log_insert(db, "messages", 2)
+    user_message, ai_message = _insert_message_pair(db, user_message, ai_message)
+    now, message_count = _read_back_after_insert(db, conversation.id)
+    logger.info(f"📝 用户消息和AI回复已写入数据库会话")
     
     logger.info(f"📊 最终统计:")
-    logger.info(f"   - 用户消息ID: {user_message.id}")
-    logger.info(f"   - AI回复ID: {ai_message.id}")
-    logger.info(f"   - 对话总消息数: {len(conversation.messages) + 2}")
-    logger.info(f"   - 对话更新时间: {conversation.updated_at}")
+    logger.info(f"   - 用户消息ID: {user_message['id']}")
+    logger.info(f"   - AI回复ID: {ai_message['id']}")
+    logger.info(f"   - 对话总消息数: {message_count}")
+    logger.info(f"   - 对话更新时间: {now}")
     
     # 构建响应数据
     logger.info(f"📦 开始构建响应数据...")
     
-    message_response = MessageResponse(
-        id=str(user_message.id),
-        conversation_id=str(user_message.conversation_id),
-        role=user_message.role,
-        content=user_message.content,
-        content_type=user_message.content_type,
-        message_data=user_message.message_data,
-        is_processed=user_message.is_processed,
-        created_at=user_message.created_at
-    )
+    message_response = _build_message_response(user_message)
     logger.info(f"✅ 用户消息响应构建完成")
     
     conversation_response = ConversationResponse(
@@ -604,8 +801,8 @@ async def send_message_to_conversation(
         conversation_type=conversation.conversation_type,
         meta_data=conversation.meta_data,
         created_at=conversation.created_at,
-        updated_at=conversation.updated_at,
-        message_count=len(conversation.messages) + 2
+        updated_at=now,
+        message_count=message_count
     )
     logger.info(f"✅ 对话响应构建完成")
     
@@ -615,20 +812,26 @@ async def send_message_to_conversation(
         ai_response=ai_response_content
     )
     
+    # 提交事务
+    db_logger.log_commit(db, 2)
+    logger.info(f"💾 开始提交数据库事务...")
+    db.commit()
+    logger.info(f"✅ 数据库事务提交成功")
+    
     logger.info(f"🎉 消息处理流程完成!")
     logger.info(f"📤 准备返回响应给客户端")
     logger.info(f"💬 AI回复长度: {len(ai_response_content)} 字符")
-    logger.info(f"📊 对话消息总数: {len(conversation.messages) + 2}")
+    logger.info(f"📊 对话消息总数: {conversation_response.message_count}")
     
     return response
 
 
 @router.get("/{conversation_id}/messages", response_model=List[MessageResponse], summary="获取对话消息")
 async def get_conversation_messages(
-    conversation_id: str,
+    request: Request,
+    conversation_id: str = Depends(verify_conversation_owner),
     skip: int = Query(0, ge=0, description="跳过记录数"),
     limit: int = Query(50, ge=1, le=100, description="返回记录数"),
-    current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
@@ -638,40 +841,23 @@ async def get_conversation_messages(
     - **skip**: 跳过记录数（分页用）
     - **limit**: 返回记录数（最大100）
     """
-    # 验证对话所有权
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="对话不存在"
-        )
+    last_created, total = _messages_fingerprint(db, conversation_id)
+    etag = build_etag(last_created, total, skip, limit)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     
-    # 获取消息
+    # 获取消息（对话所有权已由 verify_conversation_owner 校验）
     messages = db.query(Message).filter(
         Message.conversation_id == conversation_id
     ).order_by(Message.created_at.asc()).offset(skip).limit(limit).all()
     
-    return [
-        MessageResponse(
-            id=str(msg.id),
-            conversation_id=str(msg.conversation_id),
-            role=msg.role,
-            content=msg.content,
-            content_type=msg.content_type,
-            message_data=msg.message_data,
-            is_processed=msg.is_processed,
-            created_at=msg.created_at
-        )
-        for msg in messages
-    ]
+    return ORJSONResponse([_message_to_dict(msg) for msg in messages], headers={"ETag": etag})
 
 
 @router.get("/{conversation_id}/history", summary="获取对话历史")
 async def get_conversation_history(
+    request: Request,
+    response: Response,
     conversation_id: str,
     limit: int = Query(50, ge=1, le=100, description="返回记录数"),
     current_user: User = Depends(get_current_user),
@@ -683,18 +869,24 @@ async def get_conversation_history(
     - **conversation_id**: 对话ID
     - **limit**: 返回记录数（最大100）
     """
-    # 验证对话所有权
-    conversation = db.query(Conversation).filter(
+    # 验证对话所有权，只取响应需要的标题列和用于ETag的更新时间
+    conversation_row = db.query(Conversation.title, Conversation.updated_at).filter(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
     ).first()
     
-    if not conversation:
+    if not conversation_row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在"
         )
     
+    last_created, total = _messages_fingerprint(db, conversation_id)
+    etag = build_etag(conversation_row.updated_at, last_created, total, limit)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+    
     # 获取消息历史
     messages = db.query(Message).filter(
         Message.conversation_id == conversation_id
@@ -702,7 +894,7 @@ async def get_conversation_history(
     
     return {
         "conversation_id": conversation_id,
-        "title": conversation.title,
+        "title": conversation_row.title,
         "message_count": len(messages),
         "messages": [
             {
@@ -721,6 +913,7 @@ async def get_conversation_history(
 async def send_message_to_conversation_stream(
     conversation_id: str,
     message_data: SimpleMessageCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -731,47 +924,37 @@ async def send_message_to_conversation_stream(
     - **message_data**: 消息数据
     
     Returns:
-        流式响应，包含AI回复的实时生成过程
+        流式响应，包含AI回复的实时生成过程；消息在响应发送完毕后由后台任务落库
     """
-    import json
-    from datetime import datetime
-    
     logger.info(f"🌊 开始流式处理对话消息")
     logger.info(f"👤 用户: {current_user.username}")
     logger.info(f"💬 对话ID: {conversation_id}")
     logger.info(f"📝 消息内容: {message_data.content[:100]}...")
     
     # 验证对话存在性和所有权
-    conversation = db.query(Conversation).filter(
+    conversation_row = db.query(Conversation.title).filter(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
     ).first()
     
-    if not conversation:
+    if not conversation_row:
         logger.error(f"❌ 对话不存在或无权限访问")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对话不存在"
         )
     
-    logger.info(f"✅ 对话验证通过: {conversation.title}")
+    logger.info(f"✅ 对话验证通过: {conversation_row.title}")
     
-    # 创建用户消息
-    logger.info(f"📝 开始创建用户消息...")
-    user_message = Message(
-        conversation_id=conversation_id,
-        user_id=current_user.id,
-        content=message_data.content,
-        content_type=message_data.message_type or "text",
-        role="user",
-        message_data={}
-    )
-    logger.info(f"✅ 用户消息创建完成: ID={user_message.id}")
+    # 预先分配消息ID，落库推迟到响应发送完毕后的后台任务中
+    user_id = current_user.id
+    user_message_id = uuid.uuid4()
+    ai_message_id = uuid.uuid4()
     
     # 构建对话历史
     logger.info(f"📚 开始构建对话历史...")
     conversation_history = []
-    recent_messages = conversation.messages[-5:]  # 取最近5条消息作为上下文
+    recent_messages = _get_recent_messages(db, conversation_id)  # 取最近5条消息作为上下文
     logger.info(f"📊 获取到 {len(recent_messages)} 条历史消息")
     
     for i, msg in enumerate(recent_messages):
@@ -812,43 +995,33 @@ async def send_message_to_conversation_stream(
                 if chunk.get('type') == 'content':
                     full_response = chunk.get('full_content', full_response)
                 
-                # 如果是完成信号，保存消息到数据库
+                # 如果是完成信号，登记后台落库任务
                 elif chunk.get('type') == 'done':
                     full_response = chunk.get('full_content', full_response)
-                    logger.info(f"✅ 流式生成完成，开始保存到数据库...")
-                    
-                    # 保存用户消息
-                    db.add(user_message)
-                    db.flush()  # 获取ID但不提交
+                    logger.info(f"✅ 流式生成完成，消息将在响应结束后保存到数据库")
                     
-                    # 创建AI回复消息
-                    ai_message = Message(
-                        conversation_id=conversation_id,
-                        user_id=None,  # AI消息没有用户ID
-                        content=full_response,
-                        content_type="text",
-                        role="assistant",
-                        message_data={
+                    background_tasks.add_task(
+                        _persist_stream_messages,
+                        conversation_id,
+                        user_id,
+                        user_message_id,
+                        message_data.content,
+                        message_data.message_type or "text",
+                        ai_message_id,
+                        full_response,
+                        {
                             'rag_used': True,
                             'streaming': True,
                             'timestamp': datetime.now().isoformat()
                         }
                     )
-                    db.add(ai_message)
-                    
-                    # 更新对话时间戳
-                    conversation.updated_at = datetime.now()
-                    
-                    # 提交事务
-                    db.commit()
-                    logger.info(f"✅ 消息已保存到数据库")
                     
                     # 发送最终完成信号
                     final_chunk = {
                         'type': 'final',
                         'message': '回复生成完成',
-                        'user_message_id': str(user_message.id),
-                        'ai_message_id': str(ai_message.id),
+                        'user_message_id': str(user_message_id),
+                        'ai_message_id': str(ai_message_id),
                         'full_content': full_response,
                         'timestamp': datetime.now().isoformat()
                     }
@@ -873,13 +1046,13 @@ async def send_message_to_conversation_stream(
             yield f"data: {json.dumps(error_chunk, ensure_ascii=False)}\n\n"
     
     # 返回流式响应
+    # background_tasks由FastAPI挂到响应上，Starlette在流式内容全部发送后才执行
     return StreamingResponse(
         generate_stream(),
-        media_type="text/plain; charset=utf-8",
+        media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "Content-Type": "text/event-stream",
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Headers": "*",
         }
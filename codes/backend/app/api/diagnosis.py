@@ -3,11 +3,21 @@
 处理智能诊断相关功能
 """
 
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import ast
+import hashlib
+import json
+from datetime import datetime
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text
 from ..database import get_db
+from ..cache import get_cache, set_cache
+from ..config import settings
+from ..utils.etag import build_etag, is_not_modified, not_modified_response
 from ..auth import get_current_user
 from ..models.user import User
 from ..models.diagnosis import (
@@ -16,11 +26,136 @@ from ..models.diagnosis import (
 )
 from ..modules.diagnosis import DiagnosisEngine, DiagnosisInput, DiagnosisOutput
 
-router = APIRouter(prefix="/diagnosis", tags=["诊断"])
+router = APIRouter(prefix="/diagnosis", tags=["诊断"], default_response_class=ORJSONResponse)
 
 # 创建诊断引擎实例
 diagnosis_engine = DiagnosisEngine()
 
+# 诊断统计摘要：总数、平均置信度、风险分布和最近记录在一条语句内完成
+DIAGNOSIS_STATS_SQL = text("""
+    WITH user_diagnoses AS (
+        SELECT id, symptoms, risk_level, confidence_score, created_at
+        FROM diagnoses
+        WHERE user_id = :user_id
+    ),
+    stats AS (
+        SELECT count(*) AS total_diagnoses, avg(confidence_score) AS average_confidence
+        FROM user_diagnoses
+    ),
+    risks AS (
+        SELECT COALESCE(json_object_agg(risk_level, risk_count), '{}'::json) AS risk_distribution
+        FROM (
+            SELECT COALESCE(risk_level, 'unknown') AS risk_level, count(*) AS risk_count
+            FROM user_diagnoses
+            GROUP BY 1
+        ) grouped
+    ),
+    recent AS (
+        SELECT COALESCE(json_agg(json_build_object(
+            'id', id::text,
+            'symptoms', symptoms,
+            'risk_level', risk_level,
+            'confidence_score', confidence_score,
+            'created_at', created_at
+        ) ORDER BY created_at DESC), '[]'::json) AS recent_diagnoses
+        FROM (
+            SELECT * FROM user_diagnoses
+            ORDER BY created_at DESC
+            LIMIT 5
+        ) latest
+    )
+    SELECT stats.total_diagnoses, stats.average_confidence,
+           risks.risk_distribution, recent.recent_diagnoses
+    FROM stats, risks, recent
+""")
+
+
+def _diagnosis_cache_key(symptoms: str, user_context: Optional[dict]) -> str:
+    """根据规范化后的症状描述和用户上下文生成诊断结果缓存键"""
+    normalized = " ".join(symptoms.split()).lower()
+    payload = json.dumps(
+        {"symptoms": normalized, "user_context": user_context or {}},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return f"{settings.CACHE_PREFIX}diagnosis:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+# 列表接口默认投影的轻量列，不加载可能很大的diagnosis_result
+DIAGNOSIS_SUMMARY_COLUMNS = (
+    Diagnosis.id,
+    Diagnosis.user_id,
+    Diagnosis.conversation_id,
+    Diagnosis.symptoms,
+    Diagnosis.confidence_score,
+    Diagnosis.risk_level,
+    Diagnosis.recommendations,
+    Diagnosis.created_at
+)
+
+
+class DiagnosisSummaryResponse(BaseModel):
+    """诊断列表的默认摘要项，只包含DIAGNOSIS_SUMMARY_COLUMNS，不含diagnosis_result"""
+    id: str = Field(..., description="诊断记录ID")
+    user_id: str = Field(..., description="用户ID")
+    conversation_id: Optional[str] = Field(None, description="对话ID")
+    symptoms: str = Field(..., description="症状描述")
+    confidence_score: Optional[float] = Field(None, description="置信度")
+    risk_level: Optional[str] = Field(None, description="风险等级")
+    recommendations: Optional[str] = Field(None, description="建议（JSON文本）")
+    created_at: datetime = Field(..., description="创建时间")
+
+
+def _diagnoses_fingerprint(db: Session, *filters) -> tuple:
+    """诊断记录只增删不修改，用max(created_at)和记录数作为数据指纹"""
+    return db.query(
+        func.max(Diagnosis.created_at), func.count(Diagnosis.id)
+    ).filter(*filters).one()
+
+
+def _recommendations_text(value) -> Optional[str]:
+    """
+    将recommendations统一为JSON文本，与Diagnosis/DiagnosisResponse的文本字段一致
+    
+    JSONB列读出的是dict；旧记录是str(dict)写入的Python repr，迁移后仍是字符串，
+    这里解析后重新序列化，保证所有记录返回同样格式的JSON文本
+    """
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    try:
+        json.loads(value)
+        return value
+    except ValueError:
+        pass
+    try:
+        return json.dumps(ast.literal_eval(value), ensure_ascii=False)
+    except (ValueError, SyntaxError, TypeError):
+        return value
+
+
+def _diagnosis_to_dict(diagnosis) -> dict:
+    """
+    将诊断行直接转换为响应字典，列表接口据此跳过响应模型的二次校验
+    
+    完整的Diagnosis实例对应DiagnosisResponse；只投影了DIAGNOSIS_SUMMARY_COLUMNS的行
+    对应DiagnosisSummaryResponse，不包含diagnosis_result
+    """
+    data = {
+        "id": str(diagnosis.id),
+        "user_id": str(diagnosis.user_id),
+        "conversation_id": str(diagnosis.conversation_id) if diagnosis.conversation_id else None,
+        "symptoms": diagnosis.symptoms,
+        # orjson不支持Decimal，统一转为float
+        "confidence_score": float(diagnosis.confidence_score) if diagnosis.confidence_score is not None else None,
+        "risk_level": diagnosis.risk_level,
+        "recommendations": _recommendations_text(diagnosis.recommendations),
+        "created_at": diagnosis.created_at
+    }
+    if isinstance(diagnosis, Diagnosis):
+        data["diagnosis_result"] = diagnosis.diagnosis_result
+    return data
+
 
 @router.post("/analyze", response_model=DiagnosisAnalysisResponse, summary="智能诊断分析")
 async def analyze_diagnosis(
@@ -42,27 +177,38 @@ async def analyze_diagnosis(
         conversation_id=diagnosis_request.conversation_id
     )
     
-    # 执行诊断
-    diagnosis_output = diagnosis_engine.diagnose(diagnosis_input)
+    # 相同症状描述直接复用缓存的诊断结果，跳过诊断引擎
+    cache_key = _diagnosis_cache_key(diagnosis_request.symptoms, diagnosis_request.user_context)
+    cached_result = get_cache(cache_key)
+    
+    if cached_result:
+        diagnosis_result = json.loads(cached_result)
+    else:
+        # 执行诊断（同步的诊断引擎放到线程池中执行，避免阻塞事件循环）
+        diagnosis_output = await run_in_threadpool(diagnosis_engine.diagnose, diagnosis_input)
+        
+        # 只序列化一次诊断结果，入库、缓存与响应共用
+        diagnosis_result = diagnosis_output.model_dump()
+        set_cache(cache_key, json.dumps(diagnosis_result, ensure_ascii=False), expire=settings.CACHE_TTL)
     
     # 保存诊断记录到数据库
     diagnosis_record = Diagnosis(
         user_id=current_user.id,
         conversation_id=diagnosis_request.conversation_id,
         symptoms=diagnosis_request.symptoms,
-        diagnosis_result=diagnosis_output.model_dump(),
-        confidence_score=diagnosis_output.overall_confidence,
-        risk_level=diagnosis_output.risk_assessment.get('disease_risk', 'low'),
-        recommendations=str(diagnosis_output.recommendations)
+        diagnosis_result=diagnosis_result,
+        confidence_score=diagnosis_result['overall_confidence'],
+        risk_level=diagnosis_result['risk_assessment'].get('disease_risk', 'low'),
+        # 模型字段仍为文本，写入JSON文本；JSONB列会将其解析为结构化数据
+        recommendations=json.dumps(diagnosis_result['recommendations'], ensure_ascii=False)
     )
     
     db.add(diagnosis_record)
     db.commit()
-    db.refresh(diagnosis_record)
     
     # 构建响应
     diagnosis_results = []
-    for result in diagnosis_output.results:
+    for result in diagnosis_result['results']:
         diagnosis_results.append({
             "disease": result.get('disease', ''),
             "confidence": result.get('confidence', 0.0),
@@ -75,54 +221,38 @@ async def analyze_diagnosis(
     return DiagnosisAnalysisResponse(
         diagnosis_id=str(diagnosis_record.id),
         results=diagnosis_results,
-        overall_confidence=diagnosis_output.overall_confidence,
-        risk_assessment=diagnosis_output.risk_assessment,
-        recommendations=diagnosis_output.recommendations,
-        processing_time=diagnosis_output.processing_time
+        overall_confidence=diagnosis_result['overall_confidence'],
+        risk_assessment=diagnosis_result['risk_assessment'],
+        recommendations=diagnosis_result['recommendations'],
+        processing_time=diagnosis_result['processing_time']
     )
 
 
 # 将具体路径放在参数化路径之前
 @router.get("/stats/summary", summary="获取诊断统计摘要")
 async def get_diagnosis_stats(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     获取当前用户的诊断统计摘要
     """
-    # 获取诊断记录总数
-    total_diagnoses = db.query(Diagnosis).filter(Diagnosis.user_id == current_user.id).count()
+    last_created, total = _diagnoses_fingerprint(db, Diagnosis.user_id == current_user.id)
+    etag = build_etag(current_user.id, last_created, total)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
     
-    # 获取不同风险等级的统计
-    risk_stats = db.query(Diagnosis.risk_level, func.count(Diagnosis.id)).filter(
-        Diagnosis.user_id == current_user.id
-    ).group_by(Diagnosis.risk_level).all()
-    
-    # 获取平均置信度
-    avg_confidence = db.query(func.avg(Diagnosis.confidence_score)).filter(
-        Diagnosis.user_id == current_user.id
-    ).scalar() or 0.0
-    
-    # 获取最近的诊断记录
-    recent_diagnoses = db.query(Diagnosis).filter(
-        Diagnosis.user_id == current_user.id
-    ).order_by(Diagnosis.created_at.desc()).limit(5).all()
+    # 一次往返取回全部统计数据，JSON在数据库端组装
+    stats = db.execute(DIAGNOSIS_STATS_SQL, {"user_id": str(current_user.id)}).one()
     
     return {
-        "total_diagnoses": total_diagnoses,
-        "risk_distribution": dict(risk_stats),
-        "average_confidence": float(avg_confidence),
-        "recent_diagnoses": [
-            {
-                "id": str(diag.id),
-                "symptoms": diag.symptoms,
-                "risk_level": diag.risk_level,
-                "confidence_score": diag.confidence_score,
-                "created_at": diag.created_at
-            }
-            for diag in recent_diagnoses
-        ]
+        "total_diagnoses": stats.total_diagnoses,
+        "risk_distribution": stats.risk_distribution,
+        "average_confidence": float(stats.average_confidence or 0.0),
+        "recent_diagnoses": stats.recent_diagnoses
     }
 
 
@@ -143,11 +273,17 @@ async def get_diagnosis_engine_stats():
     }
 
 
-@router.get("/", response_model=List[DiagnosisResponse], summary="获取诊断记录")
+@router.get(
+    "/",
+    response_model=List[Union[DiagnosisSummaryResponse, DiagnosisResponse]],
+    summary="获取诊断记录"
+)
 async def get_diagnoses(
+    request: Request,
     skip: int = Query(0, ge=0, description="跳过记录数"),
     limit: int = Query(20, ge=1, le=100, description="返回记录数"),
     conversation_id: Optional[str] = Query(None, description="对话ID过滤"),
+    expand: Optional[str] = Query(None, description="传入full时返回完整的诊断结果"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -157,28 +293,28 @@ async def get_diagnoses(
     - **skip**: 跳过记录数（分页用）
     - **limit**: 返回记录数（最大100）
     - **conversation_id**: 对话ID过滤（可选）
+    - **expand**: 为full时返回完整的DiagnosisResponse，默认返回不含diagnosis_result的DiagnosisSummaryResponse
     """
-    query = db.query(Diagnosis).filter(Diagnosis.user_id == current_user.id)
+    filters = [Diagnosis.user_id == current_user.id]
     
     if conversation_id:
-        query = query.filter(Diagnosis.conversation_id == conversation_id)
+        filters.append(Diagnosis.conversation_id == conversation_id)
+    
+    last_created, total = _diagnoses_fingerprint(db, *filters)
+    etag = build_etag(current_user.id, last_created, total, skip, limit, conversation_id, expand)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    if expand == "full":
+        query = db.query(Diagnosis)
+    else:
+        query = db.query(*DIAGNOSIS_SUMMARY_COLUMNS)
+    
+    query = query.filter(*filters)
     
     diagnoses = query.order_by(Diagnosis.created_at.desc()).offset(skip).limit(limit).all()
     
-    return [
-        DiagnosisResponse(
-            id=str(diag.id),
-            user_id=str(diag.user_id),
-            conversation_id=str(diag.conversation_id) if diag.conversation_id else None,
-            symptoms=diag.symptoms,
-            diagnosis_result=diag.diagnosis_result,
-            confidence_score=diag.confidence_score,
-            risk_level=diag.risk_level,
-            recommendations=diag.recommendations,
-            created_at=diag.created_at
-        )
-        for diag in diagnoses
-    ]
+    return ORJSONResponse([_diagnosis_to_dict(diag) for diag in diagnoses], headers={"ETag": etag})
 
 
 @router.get("/{diagnosis_id}", response_model=DiagnosisResponse, summary="获取诊断详情")
@@ -211,7 +347,7 @@ async def get_diagnosis(
         diagnosis_result=diagnosis.diagnosis_result,
         confidence_score=diagnosis.confidence_score,
         risk_level=diagnosis.risk_level,
-        recommendations=diagnosis.recommendations,
+        recommendations=_recommendations_text(diagnosis.recommendations),
         created_at=diagnosis.created_at
     )
 
@@ -5,17 +5,39 @@
 
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
-from sqlalchemy.orm import Session
-from ..database import get_db
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 from ..auth import get_current_user
 from ..models.user import User
 from ..services.rag_service import get_rag_service
-import json
 import logging
+import orjson
 
-router = APIRouter(prefix="/knowledge", tags=["知识管理"])
+router = APIRouter(prefix="/knowledge", tags=["知识管理"], default_response_class=ORJSONResponse)
 logger = logging.getLogger(__name__)
 
+# RAG服务是进程级单例，导入时绑定一次，各接口直接复用
+rag_service = get_rag_service()
+
+
+class KnowledgeDocument(BaseModel):
+    """知识文档，content为必填且不能为空，其他字段原样转发给RAG服务"""
+    model_config = ConfigDict(extra="allow")
+    
+    content: str = Field(..., min_length=1, description="文档内容")
+    title: str = Field("", description="文档标题")
+    source: str = Field("", description="文档来源")
+    tags: List[str] = Field(default_factory=list, description="文档标签")
+
+
+# 上传文件中的文档列表校验器，模块加载时构建一次
+knowledge_documents_adapter = TypeAdapter(List[KnowledgeDocument])
+
+
+def _documents_payload(documents: List[KnowledgeDocument]) -> List[dict]:
+    """转换为发送给RAG服务的字典，只包含调用方提供的字段"""
+    return [doc.model_dump(exclude_unset=True) for doc in documents]
+
 
 @router.get("/status", summary="获取RAG服务状态")
 async def get_rag_status():
@@ -26,7 +48,6 @@ async def get_rag_status():
         RAG服务状态信息
     """
     try:
-        rag_service = get_rag_service()
         service_info = rag_service.get_service_info()
         
         return {
@@ -44,7 +65,7 @@ async def get_rag_status():
 
 @router.post("/documents", summary="添加知识文档")
 async def add_knowledge_documents(
-    documents: List[dict],
+    documents: List[KnowledgeDocument],
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -62,16 +83,6 @@ async def add_knowledge_documents(
                 detail="文档列表不能为空"
             )
         
-        # 验证文档格式
-        for doc in documents:
-            if not doc.get('content'):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="文档内容不能为空"
-                )
-        
-        rag_service = get_rag_service()
-        
         if not rag_service.is_available():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -79,7 +90,7 @@ async def add_knowledge_documents(
             )
         
         # 添加文档到RAG系统
-        success = await rag_service.add_knowledge_documents(documents)
+        success = await rag_service.add_knowledge_documents(_documents_payload(documents))
         
         if success:
             return {
@@ -125,8 +136,6 @@ async def query_knowledge(
                 detail="查询问题不能为空"
             )
         
-        rag_service = get_rag_service()
-        
         if not rag_service.is_available():
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -177,12 +186,12 @@ async def upload_knowledge_file(
                 detail="只支持JSON格式文件"
             )
         
-        # 读取文件内容
+        # 读取文件内容，orjson直接解析字节，无需先解码为字符串
         content = await file.read()
         
         try:
-            documents = json.loads(content.decode('utf-8'))
-        except json.JSONDecodeError as e:
+            documents = orjson.loads(content)
+        except orjson.JSONDecodeError as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"JSON格式错误: {str(e)}"
@@ -195,19 +204,14 @@ async def upload_knowledge_file(
             )
         
         # 验证文档格式
-        for i, doc in enumerate(documents):
-            if not isinstance(doc, dict):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"第{i+1}个文档格式错误，应为对象格式"
-                )
-            if not doc.get('content'):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"第{i+1}个文档缺少content字段"
-                )
-        
-        rag_service = get_rag_service()
+        try:
+            documents = knowledge_documents_adapter.validate_python(documents)
+        except ValidationError as e:
+            error = e.errors()[0]
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"第{error['loc'][0] + 1}个文档格式错误: {error['msg']}"
+            )
         
         if not rag_service.is_available():
             raise HTTPException(
@@ -216,7 +220,7 @@ async def upload_knowledge_file(
             )
         
         # 添加文档到RAG系统
-        success = await rag_service.add_knowledge_documents(documents)
+        success = await rag_service.add_knowledge_documents(_documents_payload(documents))
         
         if success:
             return {
@@ -255,8 +259,6 @@ async def test_rag_service(
         测试结果
     """
     try:
-        rag_service = get_rag_service()
-        
         if not rag_service.is_available():
             return {
                 "status": "error",
@@ -283,5 +285,5 @@ async def test_rag_service(
         return {
             "status": "error",
             "message": f"测试失败: {str(e)}",
-            "service_info": get_rag_service().get_service_info() if get_rag_service() else None
+            "service_info": rag_service.get_service_info()
         }
\ No newline at end of file
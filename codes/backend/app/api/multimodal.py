@@ -3,11 +3,26 @@
 处理文本、音频、图像等多种模态的输入
 """
 
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, status, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_db, get_db_context
+from ..config import settings
+from ..cache import get_cache, set_cache, delete_cache
 from ..auth import get_current_user
+from ..utils.etag import build_etag, is_not_modified, not_modified_response
 from ..models.user import User
 from ..models.multimodal import (
     MultimodalInput, MultimodalOutput, MultimodalInputCreate, MultimodalOutputResponse,
@@ -15,22 +30,260 @@ from ..models.multimodal import (
     AudioProcessingResponse, ImageProcessingRequest, ImageProcessingResponse,
     FusionRequest, FusionResponse
 )
-from ..modules.multimodal import MultimodalProcessor, TextProcessor, AudioProcessor, ImageProcessor, ModalityFusion
+from ..modules.multimodal import (
+    MultimodalProcessor, TextProcessor, AudioProcessor, ImageProcessor, ModalityFusion
+)
+from ..modules.multimodal.process_pool import create_process_pool, run_audio, run_image
+
+router = APIRouter(prefix="/multimodal", tags=["多模态处理"], default_response_class=ORJSONResponse)
+
+
+def init_multimodal_processors(app: FastAPI) -> None:
+    """
+    创建多模态处理器并挂载到app.state
+    
+    在应用lifespan启动阶段调用，每个worker进程只初始化一次，
+    导入本模块不再触发处理器初始化
+    """
+    app.state.multimodal_processor = MultimodalProcessor()
+    app.state.text_processor = TextProcessor()
+    app.state.audio_processor = AudioProcessor()
+    app.state.image_processor = ImageProcessor()
+    app.state.fusion_processor = ModalityFusion()
+    
+    # 配置了进程数时，音频/图像处理在常驻进程池中执行，子进程内的处理器跨请求复用
+    app.state.media_process_pool = (
+        create_process_pool(settings.MULTIMODAL_PROCESS_WORKERS)
+        if settings.MULTIMODAL_PROCESS_WORKERS > 0 else None
+    )
+
+
+async def shutdown_multimodal_processors(app: FastAPI) -> None:
+    """在应用lifespan关闭阶段停止媒体处理进程池"""
+    media_process_pool = getattr(app.state, "media_process_pool", None)
+    if media_process_pool is not None:
+        await asyncio.to_thread(media_process_pool.shutdown, cancel_futures=True)
+
+
+def get_multimodal_processor(request: Request) -> MultimodalProcessor:
+    """获取多模态综合处理器"""
+    return request.app.state.multimodal_processor
+
+
+def get_text_processor(request: Request) -> TextProcessor:
+    """获取文本处理器"""
+    return request.app.state.text_processor
+
+
+def get_audio_processor(request: Request) -> AudioProcessor:
+    """获取音频处理器"""
+    return request.app.state.audio_processor
+
+
+def get_image_processor(request: Request) -> ImageProcessor:
+    """获取图像处理器"""
+    return request.app.state.image_processor
+
+
+def get_media_process_pool(request: Request) -> Optional[ProcessPoolExecutor]:
+    """获取音频/图像处理进程池，未启用时返回None"""
+    return request.app.state.media_process_pool
+
+
+async def _run_media_processing(media_process_pool: Optional[ProcessPoolExecutor],
+                                pool_fn, processor_fn, data: bytes) -> Dict[str, Any]:
+    """
+    执行音频/图像处理
+    
+    启用进程池时在子进程中执行，否则在线程池中调用当前进程的处理器
+    
+    Args:
+        media_process_pool: 进程池，未启用时为None
+        pool_fn: 子进程中执行的函数（run_audio/run_image）
+        processor_fn: 当前进程中的处理方法
+        data: 音频/图像原始字节
+        
+    Returns:
+        Dict[str, Any]: 处理器返回的结果字典
+    """
+    if media_process_pool is None:
+        return await run_in_threadpool(processor_fn, data)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(media_process_pool, pool_fn, data)
+
+
+def _decode_base64_data(data: str, field_name: str) -> bytes:
+    """解码请求体中base64编码的音频/图像数据，格式错误时返回400"""
+    try:
+        return base64.b64decode(data, validate=True)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field_name}不是有效的base64编码"
+        )
+
+
+def get_fusion_processor(request: Request) -> ModalityFusion:
+    """获取模态融合处理器"""
+    return request.app.state.fusion_processor
+
+
+# 上传文件分块读取的块大小（1MB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 允许上传的音频、图像文件类型
+ALLOWED_AUDIO_TYPES = frozenset({"audio/wav", "audio/mp3", "audio/mpeg", "audio/ogg", "audio/flac"})
+ALLOWED_IMAGE_TYPES = frozenset({"image/jpeg", "image/png", "image/gif", "image/bmp", "image/webp"})
+
+# 处理结果缓存的版本号，处理器或模型升级时递增，使旧结果自然失效
+RESULT_CACHE_VERSION = "v1"
+
+
+def _result_cache_key(kind: str, payload: bytes, *params) -> str:
+    """
+    根据输入内容的SHA-256生成处理结果缓存键
+    
+    Args:
+        kind: 处理类型（text/audio/image/fusion）
+        payload: 参与哈希的输入内容
+        params: 影响结果的其他参数，如文件类型、处理类型
+    """
+    return _digest_cache_key(kind, hashlib.sha256(payload).hexdigest(), *params)
+
+
+def _digest_cache_key(kind: str, digest: str, *params) -> str:
+    """
+    根据已计算好的SHA-256摘要生成处理结果缓存键
+    
+    上传接口在分块读取时已增量计算摘要，无需再次遍历文件内容
+    """
+    scope = ":".join(str(param) for param in params)
+    return f"{settings.CACHE_PREFIX}multimodal:{kind}:{RESULT_CACHE_VERSION}:{scope}:{digest}"
+
+
+def _get_cached_result(cache_key: str) -> Optional[dict]:
+    """读取缓存的处理结果，未命中返回None"""
+    cached = get_cache(cache_key)
+    return json.loads(cached) if cached else None
+
+
+def _set_cached_result(cache_key: str, response) -> None:
+    """缓存处理结果响应"""
+    set_cache(cache_key, response.model_dump_json(), expire=settings.CACHE_TTL)
+
+
+def _audio_response(result: Dict[str, Any]) -> AudioProcessingResponse:
+    """将AudioProcessor.process_audio返回的字典映射为音频处理响应"""
+    return AudioProcessingResponse(
+        transcription=result.get('text', ''),
+        speaker_id=result.get('speaker', {}).get('speaker_id'),
+        emotion=result.get('emotion', 'neutral'),
+        confidence_score=result.get('confidence', 0.0),
+        processing_time=result.get('processing_time', 0.0)
+    )
+
+
+def _image_response(result: Dict[str, Any]) -> ImageProcessingResponse:
+    """
+    将ImageProcessor.process_image返回的字典映射为图像处理响应
+    
+    处理器不单独给出质量分，检测到的异常即图像质量问题，质量分取1减去最高的异常置信度
+    """
+    anomalies = result.get('anomalies', [])
+    return ImageProcessingResponse(
+        features=result.get('features', {}),
+        symptoms=[anomaly['description'] for anomaly in anomalies],
+        quality_score=1.0 - max((anomaly.get('confidence', 0.0) for anomaly in anomalies), default=0.0),
+        confidence_score=result.get('confidence', 0.0),
+        processing_time=result.get('processing_time', 0.0)
+    )
+
+
+def _output_to_dict(output: MultimodalOutput) -> dict:
+    """将输出行直接转换为响应字典，读取接口据此跳过响应模型的二次校验"""
+    return {
+        "id": str(output.id),
+        "input_id": str(output.input_id),
+        "text_result": output.text_result,
+        "audio_result": output.audio_result,
+        "image_result": output.image_result,
+        "fusion_result": output.fusion_result,
+        "confidence_score": float(output.confidence_score) if output.confidence_score is not None else None,
+        "processing_time": float(output.processing_time) if output.processing_time is not None else None,
+        "created_at": output.created_at
+    }
 
-router = APIRouter(prefix="/multimodal", tags=["多模态处理"])
 
-# 创建处理器实例
-multimodal_processor = MultimodalProcessor()
-text_processor = TextProcessor()
-audio_processor = AudioProcessor()
-image_processor = ImageProcessor()
-fusion_processor = ModalityFusion()
+def _output_payload(output) -> dict:
+    """把处理器输出转换为可写入JSON列的字典，只转换一次供多列共用"""
+    if hasattr(output, 'model_dump'):
+        return output.model_dump(mode="json")
+    if hasattr(output, 'dict'):
+        return output.dict()
+    return {}
+
+
+def _ndjson_line(payload: dict) -> bytes:
+    """序列化为一行NDJSON"""
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+
+def _output_cache_key(output_id: str) -> str:
+    """处理结果详情的缓存键"""
+    return f"{settings.CACHE_PREFIX}multimodal:output:{output_id}"
+
+
+def _encode_history_cursor(created_at: datetime, output_id) -> str:
+    """把(created_at, id)编码为不透明的分页游标"""
+    raw = f"{created_at.isoformat()}|{output_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析分页游标，格式非法时返回400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, output_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), output_id
+    except (ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
+
+
+async def _read_upload(upload: UploadFile, max_bytes: int = settings.MAX_FILE_SIZE) -> Tuple[bytearray, str]:
+    """
+    按固定块大小读取上传文件，超过大小上限时立即中止
+    
+    处理器直接接收原始字节，上传接口无需再做base64编码；
+    读取的同时增量计算SHA-256，缓存键无需再对文件内容做第二遍哈希
+    
+    Args:
+        upload: 上传的文件
+        max_bytes: 允许的最大字节数
+        
+    Returns:
+        Tuple[bytearray, str]: 文件内容及其SHA-256十六进制摘要
+    """
+    buffer = bytearray()
+    hasher = hashlib.sha256()
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        hasher.update(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="上传文件过大"
+            )
+    return buffer, hasher.hexdigest()
 
 
 @router.post("/process", response_model=MultimodalOutputResponse, summary="多模态综合处理")
 async def process_multimodal(
     multimodal_input: MultimodalInputCreate,
     current_user: User = Depends(get_current_user),
+    multimodal_processor: MultimodalProcessor = Depends(get_multimodal_processor),
     db: Session = Depends(get_db)
 ):
     """
@@ -52,9 +305,8 @@ async def process_multimodal(
         input_type="multimodal"
     )
     
+    # 输入记录与输出记录在处理完成后同一事务写入，处理期间不占用数据库连接
     db.add(db_input)
-    db.commit()
-    db.refresh(db_input)
     
     # 执行多模态处理
     try:
@@ -65,27 +317,32 @@ async def process_multimodal(
             image_data=multimodal_input.image_data
         )
         
-        # 处理多模态数据
-        output = multimodal_processor.process_input(input_data)
+        # 处理多模态数据（同步处理器放到线程池中执行，避免阻塞事件循环）
+        output = await run_in_threadpool(multimodal_processor.process_input, input_data)
+        
+        # flush写入输入记录并取得主键，不提交事务
+        db.flush()
+        
+        # 处理结果只转换一次，文本结果与融合结果共用同一份数据
+        output_payload = _output_payload(output)
         
         # 创建输出记录
         db_output = MultimodalOutput(
             input_id=db_input.id,
             user_id=current_user.id,
             session_id=multimodal_input.session_id,
-            text_result=output.dict() if hasattr(output, 'dict') else {},
+            text_result=output_payload,
             audio_result=None,
             image_result=None,
-            fusion_result=output.dict() if hasattr(output, 'dict') else {},
+            fusion_result=output_payload,
             confidence_score=output.confidence,
             processing_time=output.processing_time
         )
         
         db.add(db_output)
-        db.commit()
-        db.refresh(db_output)
+        db.flush()
         
-        return MultimodalOutputResponse(
+        response = MultimodalOutputResponse(
             id=str(db_output.id),
             input_id=str(db_input.id),
             user_id=str(db_output.user_id),
@@ -99,8 +356,14 @@ async def process_multimodal(
             created_at=db_output.created_at
         )
         
+        # 输入和输出记录一次提交
+        db.commit()
+        
+        return response
+        
     except Exception as e:
-        # 如果处理失败，记录错误信息
+        # 如果处理失败，记录错误信息，输入记录和错误输出同样一次提交
+        db.flush()
         db_output = MultimodalOutput(
             input_id=db_input.id,
             user_id=current_user.id,
@@ -122,10 +385,118 @@ async def process_multimodal(
         )
 
 
+def _persist_stream_output(user_id, multimodal_input: MultimodalInputCreate, output_fields: dict) -> dict:
+    """
+    流式处理完成后在独立会话中一次写入输入和输出记录
+    
+    Args:
+        user_id: 用户ID
+        multimodal_input: 多模态输入
+        output_fields: 输出记录的结果字段
+        
+    Returns:
+        dict: 输出记录的响应字典
+    """
+    with get_db_context() as db:
+        db_input = MultimodalInput(
+            user_id=user_id,
+            session_id=multimodal_input.session_id,
+            text_data=multimodal_input.text_data,
+            audio_data=multimodal_input.audio_data,
+            image_data=multimodal_input.image_data,
+            input_type="multimodal"
+        )
+        db.add(db_input)
+        db.flush()
+        
+        db_output = MultimodalOutput(
+            input_id=db_input.id,
+            user_id=user_id,
+            session_id=multimodal_input.session_id,
+            **output_fields
+        )
+        db.add(db_output)
+        db.flush()
+        
+        return _output_to_dict(db_output)
+
+
+@router.post("/process/stream", summary="多模态综合处理（流式）")
+async def process_multimodal_stream(
+    multimodal_input: MultimodalInputCreate,
+    current_user: User = Depends(get_current_user),
+    multimodal_processor: MultimodalProcessor = Depends(get_multimodal_processor)
+):
+    """
+    流式处理多模态输入，以NDJSON逐行返回
+    
+    各模态并发处理，每完成一个模态立即输出一行 {"stage": "text|audio|image", "result": ...}；
+    全部完成后写入数据库，最后输出 {"stage": "fusion", "result": ...}。
+    处理失败时输出 {"stage": "error", "detail": ...} 后结束。
+    """
+    user_id = current_user.id
+    modality_inputs = [
+        (modality, data)
+        for modality, data in (
+            ("text", multimodal_input.text_data),
+            ("audio", multimodal_input.audio_data),
+            ("image", multimodal_input.image_data)
+        )
+        if data
+    ]
+    
+    async def process_one(modality: str, data):
+        result = await run_in_threadpool(multimodal_processor.process_modality, modality, data)
+        return modality, result
+    
+    async def generate():
+        start_time = time.time()
+        processed_results = {}
+        try:
+            for next_done in asyncio.as_completed([process_one(m, d) for m, d in modality_inputs]):
+                modality, result = await next_done
+                processed_results[modality] = result
+                yield _ndjson_line({"stage": modality, "result": result})
+            
+            # 按固定的模态顺序融合，结果与非流式接口一致
+            ordered_results = {modality: processed_results[modality] for modality, _ in modality_inputs}
+            output = await run_in_threadpool(multimodal_processor.build_output, ordered_results, start_time)
+            output_payload = _output_payload(output)
+            output_fields = dict(
+                text_result=output_payload,
+                audio_result=None,
+                image_result=None,
+                fusion_result=output_payload,
+                confidence_score=output.confidence,
+                processing_time=output.processing_time
+            )
+        except Exception as e:
+            error = {"error": str(e)}
+            await run_in_threadpool(
+                _persist_stream_output, user_id, multimodal_input,
+                dict(
+                    text_result=error,
+                    audio_result=error,
+                    image_result=error,
+                    fusion_result=error,
+                    confidence_score=0.0,
+                    processing_time=0.0
+                )
+            )
+            yield _ndjson_line({"stage": "error", "detail": f"多模态处理失败: {str(e)}"})
+            return
+        
+        output_dict = await run_in_threadpool(_persist_stream_output, user_id, multimodal_input, output_fields)
+        yield _ndjson_line({"stage": "fusion", "result": output_dict})
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.post("/text", response_model=TextProcessingResponse, summary="文本处理")
 async def process_text(
     text_request: TextProcessingRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    text_processor: TextProcessor = Depends(get_text_processor)
 ):
     """
     处理文本输入
@@ -134,23 +505,30 @@ async def process_text(
     - **language**: 语言（可选，默认中文）
     - **processing_type**: 处理类型（可选）
     """
+    # 相同请求直接返回缓存结果
+    cache_key = _result_cache_key("text", text_request.model_dump_json().encode("utf-8"))
+    cached_result = _get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
     try:
         # 执行文本处理
-        result = text_processor.process_text(
-            text=text_request.text
-        )
+        result = await run_in_threadpool(text_processor.process_text, text_request.text)
         
         # 处理sentiment字段，如果是字典则提取主要情感
         sentiment_data = result.get('sentiment', {})
         sentiment_str = sentiment_data.get('primary', 'neutral') if isinstance(sentiment_data, dict) else str(sentiment_data)
         
-        return TextProcessingResponse(
+        response = TextProcessingResponse(
             processed_text=result.get('cleaned_text', text_request.text),
             entities=result.get('entities', []),
             sentiment=sentiment_str,
             confidence=result.get('confidence', 0.0),
             processing_time=result.get('processing_time', 0.0)
         )
+        _set_cached_result(cache_key, response)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -162,7 +540,9 @@ async def process_text(
 @router.post("/audio", response_model=AudioProcessingResponse, summary="音频处理")
 async def process_audio(
     audio_request: AudioProcessingRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audio_processor: AudioProcessor = Depends(get_audio_processor),
+    media_process_pool: Optional[ProcessPoolExecutor] = Depends(get_media_process_pool)
 ):
     """
     处理音频输入
@@ -172,22 +552,27 @@ async def process_audio(
     - **sample_rate**: 采样率（可选）
     - **processing_type**: 处理类型（可选）
     """
+    # 相同输入直接返回缓存结果
+    cache_key = _result_cache_key("audio", audio_request.model_dump_json().encode("utf-8"))
+    cached_result = _get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
+    audio_content = _decode_base64_data(audio_request.audio_data, "音频数据")
+    
     try:
         # 执行音频处理
-        result = audio_processor.process_audio(
-            audio_data=audio_request.audio_data,
-            audio_format=audio_request.audio_format,
-            sample_rate=audio_request.sample_rate,
-            processing_type=audio_request.processing_type
+        result = await _run_media_processing(
+            media_process_pool,
+            run_audio,
+            audio_processor.process_audio,
+            audio_content
         )
         
-        return AudioProcessingResponse(
-            transcription=result.transcription,
-            speaker_id=result.speaker_id,
-            emotion=result.emotion,
-            confidence_score=result.confidence_score,
-            processing_time=result.processing_time
-        )
+        response = _audio_response(result)
+        _set_cached_result(cache_key, response)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -200,7 +585,9 @@ async def process_audio(
 async def process_audio_file(
     audio_file: UploadFile = File(..., description="音频文件"),
     processing_type: Optional[str] = Form(None, description="处理类型"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    audio_processor: AudioProcessor = Depends(get_audio_processor),
+    media_process_pool: Optional[ProcessPoolExecutor] = Depends(get_media_process_pool)
 ):
     """
     上传并处理音频文件
@@ -209,35 +596,34 @@ async def process_audio_file(
     - **processing_type**: 处理类型（可选）
     """
     # 检查文件类型
-    allowed_types = ["audio/wav", "audio/mp3", "audio/mpeg", "audio/ogg", "audio/flac"]
-    if audio_file.content_type not in allowed_types:
+    if audio_file.content_type not in ALLOWED_AUDIO_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的音频文件格式"
         )
     
+    # 分块读取文件内容，原始字节直接交给处理器
+    audio_content, audio_digest = await _read_upload(audio_file)
+    
+    # 相同输入直接返回缓存结果
+    cache_key = _digest_cache_key("audio", audio_digest, audio_file.content_type, processing_type)
+    cached_result = _get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
     try:
-        # 读取文件内容
-        audio_content = await audio_file.read()
-        
-        # 转换为base64
-        import base64
-        audio_data = base64.b64encode(audio_content).decode('utf-8')
-        
         # 执行音频处理
-        result = audio_processor.process_audio(
-            audio_data=audio_data,
-            audio_format=audio_file.content_type,
-            processing_type=processing_type
+        result = await _run_media_processing(
+            media_process_pool,
+            run_audio,
+            audio_processor.process_audio,
+            audio_content
         )
         
-        return AudioProcessingResponse(
-            transcription=result.transcription,
-            speaker_id=result.speaker_id,
-            emotion=result.emotion,
-            confidence_score=result.confidence_score,
-            processing_time=result.processing_time
-        )
+        response = _audio_response(result)
+        _set_cached_result(cache_key, response)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -249,7 +635,9 @@ async def process_audio_file(
 @router.post("/image", response_model=ImageProcessingResponse, summary="图像处理")
 async def process_image(
     image_request: ImageProcessingRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    image_processor: ImageProcessor = Depends(get_image_processor),
+    media_process_pool: Optional[ProcessPoolExecutor] = Depends(get_media_process_pool)
 ):
     """
     处理图像输入
@@ -258,21 +646,27 @@ async def process_image(
     - **image_format**: 图像格式
     - **processing_type**: 处理类型（可选）
     """
+    # 相同输入直接返回缓存结果
+    cache_key = _result_cache_key("image", image_request.model_dump_json().encode("utf-8"))
+    cached_result = _get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
+    image_content = _decode_base64_data(image_request.image_data, "图像数据")
+    
     try:
         # 执行图像处理
-        result = image_processor.process_image(
-            image_data=image_request.image_data,
-            image_format=image_request.image_format,
-            processing_type=image_request.processing_type
+        result = await _run_media_processing(
+            media_process_pool,
+            run_image,
+            image_processor.process_image,
+            image_content
         )
         
-        return ImageProcessingResponse(
-            features=result.features,
-            symptoms=result.symptoms,
-            quality_score=result.quality_score,
-            confidence_score=result.confidence_score,
-            processing_time=result.processing_time
-        )
+        response = _image_response(result)
+        _set_cached_result(cache_key, response)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -285,7 +679,9 @@ async def process_image(
 async def process_image_file(
     image_file: UploadFile = File(..., description="图像文件"),
     processing_type: Optional[str] = Form(None, description="处理类型"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    image_processor: ImageProcessor = Depends(get_image_processor),
+    media_process_pool: Optional[ProcessPoolExecutor] = Depends(get_media_process_pool)
 ):
     """
     上传并处理图像文件
@@ -294,35 +690,34 @@ async def process_image_file(
     - **processing_type**: 处理类型（可选）
     """
     # 检查文件类型
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/bmp", "image/webp"]
-    if image_file.content_type not in allowed_types:
+    if image_file.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的图像文件格式"
         )
     
+    # 分块读取文件内容，原始字节直接交给处理器
+    image_content, image_digest = await _read_upload(image_file)
+    
+    # 相同输入直接返回缓存结果
+    cache_key = _digest_cache_key("image", image_digest, image_file.content_type, processing_type)
+    cached_result = _get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
     try:
-        # 读取文件内容
-        image_content = await image_file.read()
-        
-        # 转换为base64
-        import base64
-        image_data = base64.b64encode(image_content).decode('utf-8')
-        
         # 执行图像处理
-        result = image_processor.process_image(
-            image_data=image_data,
-            image_format=image_file.content_type,
-            processing_type=processing_type
+        result = await _run_media_processing(
+            media_process_pool,
+            run_image,
+            image_processor.process_image,
+            image_content
         )
         
-        return ImageProcessingResponse(
-            features=result.features,
-            symptoms=result.symptoms,
-            quality_score=result.quality_score,
-            confidence_score=result.confidence_score,
-            processing_time=result.processing_time
-        )
+        response = _image_response(result)
+        _set_cached_result(cache_key, response)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -334,7 +729,8 @@ async def process_image_file(
 @router.post("/fusion", response_model=FusionResponse, summary="模态融合")
 async def fuse_modalities(
     fusion_request: FusionRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    fusion_processor: ModalityFusion = Depends(get_fusion_processor)
 ):
     """
     融合多种模态的信息
@@ -342,24 +738,46 @@ async def fuse_modalities(
     - **text_result**: 文本处理结果
     - **audio_result**: 音频处理结果
     - **image_result**: 图像处理结果
-    - **fusion_strategy**: 融合策略
+    - **fusion_strategy**: 融合策略（当前融合模块按固定权重融合，暂不区分策略）
     """
+    # 相同输入直接返回缓存结果
+    cache_key = _result_cache_key("fusion", fusion_request.model_dump_json().encode("utf-8"))
+    cached_result = _get_cached_result(cache_key)
+    if cached_result is not None:
+        return cached_result
+    
+    # fuse_modalities按text/audio/image键读取各模态结果，只传入请求中提供的模态
+    modality_data = {
+        modality: modality_result
+        for modality, modality_result in (
+            ("text", fusion_request.text_result),
+            ("audio", fusion_request.audio_result),
+            ("image", fusion_request.image_result)
+        )
+        if modality_result
+    }
+    
     try:
         # 执行模态融合
-        result = fusion_processor.fuse_modalities(
-            text_result=fusion_request.text_result,
-            audio_result=fusion_request.audio_result,
-            image_result=fusion_request.image_result,
-            fusion_strategy=fusion_request.fusion_strategy
-        )
+        start_time = time.time()
+        result = await run_in_threadpool(fusion_processor.fuse_modalities, modality_data)
+        processing_time = time.time() - start_time
         
-        return FusionResponse(
-            fused_result=result.fused_result,
-            confidence_score=result.confidence_score,
-            modality_weights=result.modality_weights,
-            conflicts_resolved=result.conflicts_resolved,
-            processing_time=result.processing_time
-        )
+        response = FusionResponse(
+            fused_result={
+                "text": result.get("text", ""),
+                "entities": result.get("entities", []),
+                "sentiment": result.get("sentiment", "neutral")
+            },
+            confidence_score=result.get("confidence", 0.0),
+            modality_weights=result.get("modality_weights", {}),
+            # 融合模块在结果中直接采用冲突处理后的值，不单独返回冲突明细
+            conflicts_resolved=[],
+            processing_time=processing_time
+        )
+        _set_cached_result(cache_key, response)
+        
+        return response
         
     except Exception as e:
         raise HTTPException(
@@ -371,8 +789,9 @@ async def fuse_modalities(
 @router.get("/history/{user_id}", response_model=List[MultimodalOutputResponse], summary="获取用户处理历史")
 async def get_processing_history(
     user_id: str,
-    skip: int = 0,
-    limit: int = 20,
+    cursor: Optional[str] = Query(None, description="分页游标"),
+    skip: int = Query(0, ge=0, le=10_000, description="跳过记录数（兼容旧客户端，传cursor时忽略）"),
+    limit: int = Query(20, ge=1, le=100, description="返回记录数"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -380,8 +799,12 @@ async def get_processing_history(
     获取用户的多模态处理历史
     
     - **user_id**: 用户ID
-    - **skip**: 跳过记录数
+    - **cursor**: 分页游标，取自上一页的X-Next-Cursor响应头，首页不传
+    - **skip**: 跳过记录数（兼容旧客户端，传cursor时忽略）
     - **limit**: 返回记录数
+    
+    按(created_at, id)倒序做游标分页，翻页深度不影响查询开销；
+    响应体仍为记录列表，下一页游标放在X-Next-Cursor响应头中，没有下一页时不返回该头
     """
     # 检查权限（只能查看自己的历史）
     if str(current_user.id) != user_id:
@@ -390,29 +813,35 @@ async def get_processing_history(
             detail="无权访问其他用户的历史记录"
         )
     
-    outputs = db.query(MultimodalOutput).filter(
+    query = db.query(MultimodalOutput).filter(
         MultimodalOutput.user_id == user_id
-    ).offset(skip).limit(limit).all()
-    
-    return [
-        MultimodalOutputResponse(
-            id=str(output.id),
-            input_id=str(output.input_id),
-            text_result=output.text_result,
-            audio_result=output.audio_result,
-            image_result=output.image_result,
-            fusion_result=output.fusion_result,
-            confidence_score=output.confidence_score,
-            processing_time=output.processing_time,
-            created_at=output.created_at
+    ).order_by(
+        MultimodalOutput.created_at.desc(),
+        MultimodalOutput.id.desc()
+    )
+    if cursor:
+        cursor_created_at, cursor_id = _decode_history_cursor(cursor)
+        query = query.filter(
+            tuple_(MultimodalOutput.created_at, MultimodalOutput.id) < (cursor_created_at, cursor_id)
         )
-        for output in outputs
-    ]
+    elif skip:
+        query = query.offset(skip)
+    
+    # 多取一条用于判断是否还有下一页
+    outputs = query.limit(limit + 1).all()
+    
+    headers = {}
+    if len(outputs) > limit:
+        outputs = outputs[:limit]
+        headers["X-Next-Cursor"] = _encode_history_cursor(outputs[-1].created_at, outputs[-1].id)
+    
+    return ORJSONResponse([_output_to_dict(output) for output in outputs], headers=headers)
 
 
 @router.get("/output/{output_id}", response_model=MultimodalOutputResponse, summary="获取处理结果详情")
 async def get_processing_output(
     output_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -421,32 +850,37 @@ async def get_processing_output(
     
     - **output_id**: 输出ID
     """
-    output = db.query(MultimodalOutput).filter(MultimodalOutput.id == output_id).first()
+    # 处理结果写入后不再修改，详情缓存在Redis中，删除时失效
+    cache_key = _output_cache_key(output_id)
+    cached = get_cache(cache_key)
+    if cached:
+        entry = orjson.loads(cached)
+    else:
+        # 按主键读取，会话标识映射中已有该行时不再查询数据库
+        output = db.get(MultimodalOutput, output_id)
+        if not output:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="处理结果不存在"
+            )
+        entry = {
+            "user_id": str(output.user_id),
+            "etag": build_etag(output.id, output.created_at),
+            "body": _output_to_dict(output)
+        }
+        set_cache(cache_key, orjson.dumps(entry).decode("utf-8"), expire=settings.CACHE_TTL)
     
-    if not output:
+    # 不属于当前用户的记录与不存在的记录同样返回404
+    if entry["user_id"] != str(current_user.id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="处理结果不存在"
         )
     
-    # 检查权限
-    if str(output.user_id) != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="无权访问此处理结果"
-        )
+    if is_not_modified(request, entry["etag"]):
+        return not_modified_response(entry["etag"])
     
-    return MultimodalOutputResponse(
-        id=str(output.id),
-        input_id=str(output.input_id),
-        text_result=output.text_result,
-        audio_result=output.audio_result,
-        image_result=output.image_result,
-        fusion_result=output.fusion_result,
-        confidence_score=output.confidence_score,
-        processing_time=output.processing_time,
-        created_at=output.created_at
-    )
+    return ORJSONResponse(entry["body"], headers={"ETag": entry["etag"]})
 
 
 @router.delete("/output/{output_id}", summary="删除处理结果")
@@ -460,23 +894,20 @@ async def delete_processing_output(
     
     - **output_id**: 输出ID
     """
-    output = db.query(MultimodalOutput).filter(MultimodalOutput.id == output_id).first()
+    # 按ID和所属用户一条DELETE完成校验与删除，不再先查询再删除
+    deleted = db.query(MultimodalOutput).filter(
+        MultimodalOutput.id == output_id,
+        MultimodalOutput.user_id == current_user.id
+    ).delete(synchronize_session=False)
     
-    if not output:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="处理结果不存在"
         )
     
-    # 检查权限
-    if str(output.user_id) != str(current_user.id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="无权删除此处理结果"
-        )
-    
-    db.delete(output)
     db.commit()
+    delete_cache(_output_cache_key(output_id))
     
     return {"message": "处理结果删除成功"}
 
@@ -499,36 +930,22 @@ async def get_processing_stats(
             detail="无权访问其他用户的统计信息"
         )
     
-    # 统计各种处理类型
-    total_processings = db.query(MultimodalOutput).filter(
-        MultimodalOutput.user_id == user_id
-    ).count()
-    
-    text_processings = db.query(MultimodalOutput).filter(
-        MultimodalOutput.user_id == user_id,
-        MultimodalOutput.text_result.isnot(None)
-    ).count()
-    
-    audio_processings = db.query(MultimodalOutput).filter(
-        MultimodalOutput.user_id == user_id,
-        MultimodalOutput.audio_result.isnot(None)
-    ).count()
-    
-    image_processings = db.query(MultimodalOutput).filter(
-        MultimodalOutput.user_id == user_id,
-        MultimodalOutput.image_result.isnot(None)
-    ).count()
-    
-    # 计算平均置信度
-    avg_confidence = db.query(db.func.avg(MultimodalOutput.confidence_score)).filter(
+    # 各处理类型的数量和平均置信度在一次扫描中完成统计（count(列)只计非NULL）
+    stats = db.query(
+        func.count(MultimodalOutput.id).label("total"),
+        func.count(MultimodalOutput.text_result).label("text"),
+        func.count(MultimodalOutput.audio_result).label("audio"),
+        func.count(MultimodalOutput.image_result).label("image"),
+        func.avg(MultimodalOutput.confidence_score).label("avg_confidence")
+    ).filter(
         MultimodalOutput.user_id == user_id
-    ).scalar() or 0.0
+    ).one()
     
     return {
         "user_id": user_id,
-        "total_processings": total_processings,
-        "text_processings": text_processings,
-        "audio_processings": audio_processings,
-        "image_processings": image_processings,
-        "avg_confidence_score": float(avg_confidence)
+        "total_processings": stats.total,
+        "text_processings": stats.text,
+        "audio_processings": stats.audio,
+        "image_processings": stats.image,
+        "avg_confidence_score": float(stats.avg_confidence or 0.0)
     }
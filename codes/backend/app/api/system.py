@@ -4,10 +4,16 @@
 """
 
 from typing import List, Optional, Dict, Any
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import func, select, true
+from sqlalchemy.orm import Session, raiseload
 from ..database import get_db
+from ..cache import get_cache, set_cache
+from ..config import settings
 from ..auth import get_current_user
+from ..services.audit_log_queue import enqueue_operation_log
 from ..models.user import User
 from ..models.config import SystemConfig, SystemConfigCreate, SystemConfigResponse
 from ..models.preference import UserPreference, UserPreferenceCreate, UserPreferenceUpdate, UserPreferenceResponse
@@ -15,7 +21,82 @@ from ..models.log import (
     OperationLog, OperationLogCreate, OperationLogResponse
 )
 
-router = APIRouter(prefix="/system", tags=["系统管理"])
+router = APIRouter(prefix="/system", tags=["系统管理"], default_response_class=ORJSONResponse)
+
+# 系统概览统计的缓存时间（秒）
+SYSTEM_OVERVIEW_CACHE_TTL = 30
+
+# 配置列表查询在模块加载时构建，请求中只追加过滤条件；
+# 响应只读取列属性，禁止意外的关系懒加载
+CONFIG_LIST_STMT = select(SystemConfig).options(raiseload("*"))
+
+# 操作日志分组统计的缓存时间（秒）
+LOG_STATS_CACHE_TTL = 60
+
+# 更新接口允许修改的字段
+CONFIG_UPDATABLE_FIELDS = {"config_value", "config_type", "description", "is_active"}
+PREFERENCE_UPDATABLE_FIELDS = {
+    "theme", "language", "notification_enabled", "email_notification",
+    "push_notification", "privacy_level", "ai_model_preference", "settings"
+}
+
+
+def _set_log_stats_cache(cache_key: str, result: dict) -> bytes:
+    """
+    序列化并缓存操作日志分组统计，返回JSON字节
+    
+    资源类型可能为NULL，键按JSON的null序列化
+    """
+    payload = orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS)
+    set_cache(cache_key, payload.decode("utf-8"), expire=LOG_STATS_CACHE_TTL)
+    return payload
+
+
+def _config_to_dict(config: SystemConfig) -> dict:
+    """将系统配置行直接转换为响应字典，接口据此跳过响应模型的二次校验"""
+    return {
+        "id": config.id,
+        "config_key": config.config_key,
+        "config_value": config.config_value,
+        "config_type": config.config_type,
+        "description": config.description,
+        "is_active": config.is_active,
+        "created_at": config.created_at,
+        "updated_at": config.updated_at
+    }
+
+
+def _preference_to_dict(preference: UserPreference) -> dict:
+    """将用户偏好行直接转换为响应字典"""
+    return {
+        "id": preference.id,
+        "user_id": preference.user_id,
+        "theme": preference.theme,
+        "language": preference.language,
+        "notification_enabled": preference.notification_enabled,
+        "email_notification": preference.email_notification,
+        "push_notification": preference.push_notification,
+        "privacy_level": preference.privacy_level,
+        "ai_model_preference": preference.ai_model_preference,
+        "settings": preference.settings,
+        "created_at": preference.created_at,
+        "updated_at": preference.updated_at
+    }
+
+
+def _log_to_dict(log: OperationLog) -> dict:
+    """将操作日志行直接转换为响应字典，UUID由orjson直接序列化"""
+    return {
+        "id": log.id,
+        "user_id": log.user_id,
+        "operation": log.operation,
+        "resource_type": log.resource_type,
+        "resource_id": log.resource_id,
+        "details": log.details or {},
+        "ip_address": str(log.ip_address) if log.ip_address else None,
+        "user_agent": log.user_agent,
+        "created_at": log.created_at
+    }
 
 
 # ==================== 系统配置管理 ====================
@@ -31,26 +112,13 @@ async def get_system_configs(
     
     - **category**: 配置分类过滤（可选）
     """
-    query = db.query(SystemConfig)
-    
+    stmt = CONFIG_LIST_STMT
     if category:
-        query = query.filter(SystemConfig.config_type == category)
-    
-    configs = query.all()
-    
-    return [
-        SystemConfigResponse(
-            id=config.id,
-            config_key=config.config_key,
-            config_value=config.config_value,
-            config_type=config.config_type,
-            description=config.description,
-            is_active=config.is_active,
-            created_at=config.created_at,
-            updated_at=config.updated_at
-        )
-        for config in configs
-    ]
+        stmt = stmt.where(SystemConfig.config_type == category)
+    
+    configs = db.execute(stmt).scalars().all()
+    
+    return ORJSONResponse([_config_to_dict(config) for config in configs])
 
 
 @router.get("/config/{config_key}", response_model=SystemConfigResponse, summary="获取系统配置详情")
@@ -63,7 +131,7 @@ async def get_system_config(
     
     - **config_key**: 配置键名
     """
-    config = db.query(SystemConfig).filter(SystemConfig.config_key == config_key).first()
+    config = db.query(SystemConfig).options(raiseload("*")).filter(SystemConfig.config_key == config_key).first()
     
     if not config:
         raise HTTPException(
@@ -71,16 +139,7 @@ async def get_system_config(
             detail="系统配置不存在"
         )
     
-    return SystemConfigResponse(
-        id=config.id,
-        config_key=config.config_key,
-        config_value=config.config_value,
-        config_type=config.config_type,
-        description=config.description,
-        is_active=config.is_active,
-        created_at=config.created_at,
-        updated_at=config.updated_at
-    )
+    return ORJSONResponse(_config_to_dict(config))
 
 
 @router.post("/config", response_model=SystemConfigResponse, summary="创建系统配置")
@@ -99,7 +158,7 @@ async def create_system_config(
     - **is_active**: 是否激活
     """
     # 检查配置键是否已存在
-    existing_config = db.query(SystemConfig).filter(SystemConfig.config_key == config_data.config_key).first()
+    existing_config = db.query(SystemConfig).options(raiseload("*")).filter(SystemConfig.config_key == config_data.config_key).first()
     if existing_config:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -116,18 +175,8 @@ async def create_system_config(
     
     db.add(new_config)
     db.commit()
-    db.refresh(new_config)
-    
-    return SystemConfigResponse(
-        id=new_config.id,
-        config_key=new_config.config_key,
-        config_value=new_config.config_value,
-        config_type=new_config.config_type,
-        description=new_config.description,
-        is_active=new_config.is_active,
-        created_at=new_config.created_at,
-        updated_at=new_config.updated_at
-    )
+    
+    return ORJSONResponse(_config_to_dict(new_config))
 
 
 @router.put("/config/{config_key}", response_model=SystemConfigResponse, summary="更新系统配置")
@@ -146,7 +195,7 @@ async def update_system_config(
     - **description**: 新描述
     - **is_active**: 新激活状态
     """
-    config = db.query(SystemConfig).filter(SystemConfig.config_key == config_key).first()
+    config = db.query(SystemConfig).options(raiseload("*")).filter(SystemConfig.config_key == config_key).first()
     
     if not config:
         raise HTTPException(
@@ -154,29 +203,16 @@ async def update_system_config(
             detail="系统配置不存在"
         )
     
-    # 更新字段
-    if config_data.config_value is not None:
-        config.config_value = config_data.config_value
-    if config_data.config_type is not None:
-        config.config_type = config_data.config_type
-    if config_data.description is not None:
-        config.description = config_data.description
-    if config_data.is_active is not None:
-        config.is_active = config_data.is_active
+    # 更新字段（未传入或为None的字段保持不变）
+    updates = config_data.model_dump(include=CONFIG_UPDATABLE_FIELDS, exclude_unset=True, exclude_none=True)
+    for field, value in updates.items():
+        setattr(config, field, value)
     
     db.commit()
-    db.refresh(config)
-    
-    return SystemConfigResponse(
-        id=config.id,
-        config_key=config.config_key,
-        config_value=config.config_value,
-        config_type=config.config_type,
-        description=config.description,
-        is_active=config.is_active,
-        created_at=config.created_at,
-        updated_at=config.updated_at
-    )
+    # updated_at由BEFORE UPDATE触发器写入，只回读该列，避免返回提交前的旧值
+    db.refresh(config, ["updated_at"])
+    
+    return ORJSONResponse(_config_to_dict(config))
 
 
 @router.delete("/config/{config_key}", summary="删除系统配置")
@@ -190,15 +226,17 @@ async def delete_system_config(
     
     - **config_key**: 配置键名
     """
-    config = db.query(SystemConfig).filter(SystemConfig.config_key == config_key).first()
+    # 一条DELETE完成存在性校验与删除，不再先查询再删除
+    deleted = db.query(SystemConfig).filter(
+        SystemConfig.config_key == config_key
+    ).delete(synchronize_session=False)
     
-    if not config:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="系统配置不存在"
         )
     
-    db.delete(config)
     db.commit()
     
     return {"message": "系统配置删除成功"}
@@ -224,7 +262,7 @@ async def get_user_preferences(
             detail="无权访问其他用户的偏好设置"
         )
     
-    preference = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+    preference = db.query(UserPreference).options(raiseload("*")).filter(UserPreference.user_id == user_id).first()
     
     if not preference:
         raise HTTPException(
@@ -232,20 +270,7 @@ async def get_user_preferences(
             detail="用户偏好不存在"
         )
     
-    return UserPreferenceResponse(
-        id=preference.id,
-        user_id=preference.user_id,
-        theme=preference.theme,
-        language=preference.language,
-        notification_enabled=preference.notification_enabled,
-        email_notification=preference.email_notification,
-        push_notification=preference.push_notification,
-        privacy_level=preference.privacy_level,
-        ai_model_preference=preference.ai_model_preference,
-        settings=preference.settings,
-        created_at=preference.created_at,
-        updated_at=preference.updated_at
-    )
+    return ORJSONResponse(_preference_to_dict(preference))
 
 
 @router.post("/preferences/{user_id}", response_model=UserPreferenceResponse, summary="创建用户偏好")
@@ -268,7 +293,7 @@ async def create_user_preference(
         )
     
     # 检查偏好是否已存在
-    existing_pref = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+    existing_pref = db.query(UserPreference).options(raiseload("*")).filter(UserPreference.user_id == user_id).first()
     
     if existing_pref:
         raise HTTPException(
@@ -290,22 +315,8 @@ async def create_user_preference(
     
     db.add(new_preference)
     db.commit()
-    db.refresh(new_preference)
-    
-    return UserPreferenceResponse(
-        id=new_preference.id,
-        user_id=new_preference.user_id,
-        theme=new_preference.theme,
-        language=new_preference.language,
-        notification_enabled=new_preference.notification_enabled,
-        email_notification=new_preference.email_notification,
-        push_notification=new_preference.push_notification,
-        privacy_level=new_preference.privacy_level,
-        ai_model_preference=new_preference.ai_model_preference,
-        settings=new_preference.settings,
-        created_at=new_preference.created_at,
-        updated_at=new_preference.updated_at
-    )
+    
+    return ORJSONResponse(_preference_to_dict(new_preference))
 
 
 @router.put("/preferences/{user_id}", response_model=UserPreferenceResponse, summary="更新用户偏好")
@@ -327,7 +338,7 @@ async def update_user_preference(
             detail="无权更新其他用户的偏好设置"
         )
     
-    preference = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+    preference = db.query(UserPreference).options(raiseload("*")).filter(UserPreference.user_id == user_id).first()
     
     if not preference:
         raise HTTPException(
@@ -335,41 +346,16 @@ async def update_user_preference(
             detail="用户偏好不存在"
         )
     
-    # 更新字段
-    if preference_data.theme is not None:
-        preference.theme = preference_data.theme
-    if preference_data.language is not None:
-        preference.language = preference_data.language
-    if preference_data.notification_enabled is not None:
-        preference.notification_enabled = preference_data.notification_enabled
-    if preference_data.email_notification is not None:
-        preference.email_notification = preference_data.email_notification
-    if preference_data.push_notification is not None:
-        preference.push_notification = preference_data.push_notification
-    if preference_data.privacy_level is not None:
-        preference.privacy_level = preference_data.privacy_level
-    if preference_data.ai_model_preference is not None:
-        preference.ai_model_preference = preference_data.ai_model_preference
-    if preference_data.settings is not None:
-        preference.settings = preference_data.settings
+    # 更新字段（未传入或为None的字段保持不变）
+    updates = preference_data.model_dump(include=PREFERENCE_UPDATABLE_FIELDS, exclude_unset=True, exclude_none=True)
+    for field, value in updates.items():
+        setattr(preference, field, value)
     
     db.commit()
-    db.refresh(preference)
-    
-    return UserPreferenceResponse(
-        id=preference.id,
-        user_id=preference.user_id,
-        theme=preference.theme,
-        language=preference.language,
-        notification_enabled=preference.notification_enabled,
-        email_notification=preference.email_notification,
-        push_notification=preference.push_notification,
-        privacy_level=preference.privacy_level,
-        ai_model_preference=preference.ai_model_preference,
-        settings=preference.settings,
-        created_at=preference.created_at,
-        updated_at=preference.updated_at
-    )
+    # updated_at由BEFORE UPDATE触发器写入，只回读该列，避免返回提交前的旧值
+    db.refresh(preference, ["updated_at"])
+    
+    return ORJSONResponse(_preference_to_dict(preference))
 
 
 @router.delete("/preferences/{user_id}", summary="删除用户偏好")
@@ -390,15 +376,17 @@ async def delete_user_preference(
             detail="无权删除其他用户的偏好设置"
         )
     
-    preference = db.query(UserPreference).filter(UserPreference.user_id == user_id).first()
+    # 一条DELETE完成存在性校验与删除，不再先查询再删除
+    deleted = db.query(UserPreference).filter(
+        UserPreference.user_id == user_id
+    ).delete(synchronize_session=False)
     
-    if not preference:
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="用户偏好不存在"
         )
     
-    db.delete(preference)
     db.commit()
     
     return {"message": "用户偏好删除成功"}
@@ -424,8 +412,10 @@ async def get_operation_logs(
     - **user_id**: 用户ID过滤（可选）
     - **operation**: 操作类型过滤（可选）
     - **resource_type**: 资源类型过滤（可选）
+    
+    过滤后的总记录数通过窗口函数随分页数据一次查出，放在X-Total-Count响应头中
     """
-    query = db.query(OperationLog)
+    query = db.query(OperationLog, func.count().over().label("total")).options(raiseload("*"))
     
     # 添加过滤条件
     if user_id:
@@ -435,22 +425,20 @@ async def get_operation_logs(
     if resource_type:
         query = query.filter(OperationLog.resource_type == resource_type)
     
-    logs = query.order_by(OperationLog.created_at.desc()).offset(skip).limit(limit).all()
-    
-    return [
-        OperationLogResponse(
-            id=str(log.id),
-            user_id=str(log.user_id) if log.user_id else None,
-            operation=log.operation,
-            resource_type=log.resource_type,
-            resource_id=log.resource_id,
-            details=log.details or {},
-            ip_address=str(log.ip_address) if log.ip_address else None,
-            user_agent=log.user_agent,
-            created_at=log.created_at
-        )
-        for log in logs
-    ]
+    rows = query.order_by(OperationLog.created_at.desc()).offset(skip).limit(limit).all()
+    
+    if rows:
+        total = rows[0].total
+    elif skip:
+        # 翻页超出范围时窗口函数没有返回行，单独统计总数
+        total = query.with_entities(func.count(OperationLog.id)).order_by(None).scalar()
+    else:
+        total = 0
+    
+    return ORJSONResponse(
+        [_log_to_dict(log) for log, _ in rows],
+        headers={"X-Total-Count": str(total)}
+    )
 
 
 @router.get("/logs/{log_id}", response_model=OperationLogResponse, summary="获取操作日志详情")
@@ -464,7 +452,7 @@ async def get_operation_log(
     
     - **log_id**: 日志ID
     """
-    log = db.query(OperationLog).filter(OperationLog.id == log_id).first()
+    log = db.query(OperationLog).options(raiseload("*")).filter(OperationLog.id == log_id).first()
     
     if not log:
         raise HTTPException(
@@ -472,24 +460,13 @@ async def get_operation_log(
             detail="操作日志不存在"
         )
     
-    return OperationLogResponse(
-        id=str(log.id),
-        user_id=str(log.user_id) if log.user_id else None,
-        operation=log.operation,
-        resource_type=log.resource_type,
-        resource_id=log.resource_id,
-        details=log.details or {},
-        ip_address=str(log.ip_address) if log.ip_address else None,
-        user_agent=log.user_agent,
-        created_at=log.created_at
-    )
+    return ORJSONResponse(_log_to_dict(log))
 
 
 @router.post("/logs", response_model=OperationLogResponse, summary="创建操作日志")
 async def create_operation_log(
     log_data: OperationLogCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     创建操作日志
@@ -501,32 +478,24 @@ async def create_operation_log(
     - **details**: 操作详情
     - **ip_address**: IP地址
     - **user_agent**: 用户代理
-    """
-    new_log = OperationLog(
-        user_id=log_data.user_id,
-        operation=log_data.operation,
-        resource_type=log_data.resource_type,
-        resource_id=log_data.resource_id,
-        details=log_data.details,
-        ip_address=log_data.ip_address,
-        user_agent=log_data.user_agent
-    )
     
-    db.add(new_log)
-    db.commit()
-    db.refresh(new_log)
-    
-    return OperationLogResponse(
-        id=str(new_log.id),
-        user_id=str(new_log.user_id) if new_log.user_id else None,
-        operation=new_log.operation,
-        resource_type=new_log.resource_type,
-        resource_id=new_log.resource_id,
-        details=new_log.details or {},
-        ip_address=str(new_log.ip_address) if new_log.ip_address else None,
-        user_agent=new_log.user_agent,
-        created_at=new_log.created_at
-    )
+    日志先写入Redis队列，由后台任务批量写入数据库，返回的id在入队时生成
+    """
+    new_log = enqueue_operation_log({
+        "user_id": log_data.user_id,
+        "operation": log_data.operation,
+        "resource_type": log_data.resource_type,
+        "resource_id": log_data.resource_id,
+        "details": log_data.details,
+        "ip_address": log_data.ip_address,
+        "user_agent": log_data.user_agent
+    })
+    
+    return ORJSONResponse({
+        **new_log,
+        "details": new_log["details"] or {},
+        "ip_address": str(new_log["ip_address"]) if new_log["ip_address"] else None
+    })
 
 
 # ==================== 系统统计信息 ====================
@@ -538,22 +507,42 @@ async def get_system_overview(
 ):
     """
     获取系统概览统计信息
-    """
-    # 统计用户数量
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    
-    # 统计系统配置数量
-    total_configs = db.query(SystemConfig).count()
-    active_configs = db.query(SystemConfig).filter(SystemConfig.is_active == True).count()
     
-    # 统计操作日志数量
-    total_logs = db.query(OperationLog).count()
-    
-    # 统计用户偏好数量
-    total_preferences = db.query(UserPreference).count()
-    
-    return {
+    统计结果以序列化后的JSON缓存30秒，命中时直接返回
+    """
+    cache_key = f"{settings.CACHE_PREFIX}system:overview"
+    cached = get_cache(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    
+    # 用户、配置的总数和激活数各用一次扫描（count(*) FILTER）得到，
+    # 与日志、偏好数量一起在一条SQL中完成统计
+    user_counts = select(
+        func.count().label("total"),
+        func.count().filter(User.is_active == True).label("active")
+    ).select_from(User).subquery()
+    config_counts = select(
+        func.count().label("total"),
+        func.count().filter(SystemConfig.is_active == True).label("active")
+    ).select_from(SystemConfig).subquery()
+    
+    counts = db.execute(select(
+        user_counts.c.total.label("total_users"),
+        user_counts.c.active.label("active_users"),
+        config_counts.c.total.label("total_configs"),
+        config_counts.c.active.label("active_configs"),
+        select(func.count()).select_from(OperationLog).scalar_subquery().label("total_logs"),
+        select(func.count()).select_from(UserPreference).scalar_subquery().label("total_preferences")
+    ).select_from(user_counts.join(config_counts, true()))).one()
+    
+    total_users = counts.total_users
+    active_users = counts.active_users
+    total_configs = counts.total_configs
+    active_configs = counts.active_configs
+    total_logs = counts.total_logs
+    total_preferences = counts.total_preferences
+    
+    overview = {
         "users": {
             "total": total_users,
             "active": active_users,
@@ -571,6 +560,10 @@ async def get_system_overview(
             "total": total_preferences
         }
     }
+    
+    payload = orjson.dumps(overview)
+    set_cache(cache_key, payload.decode("utf-8"), expire=SYSTEM_OVERVIEW_CACHE_TTL)
+    return Response(content=payload, media_type="application/json")
 
 
 @router.get("/stats/logs/operation-types", summary="获取操作类型统计")
@@ -580,17 +573,25 @@ async def get_operation_type_stats(
 ):
     """
     获取操作类型统计信息
+    
+    统计结果以序列化后的JSON缓存60秒，命中时直接返回
     """
+    cache_key = f"{settings.CACHE_PREFIX}system:log_stats:operation:v1"
+    cached = get_cache(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    
     # 统计各种操作类型的数量
     operation_stats = db.query(
         OperationLog.operation,
-        db.func.count(OperationLog.id)
+        func.count(OperationLog.id)
     ).group_by(OperationLog.operation).all()
     
-    return {
+    result = {
         "operation_types": dict(operation_stats),
         "total_operations": sum(count for _, count in operation_stats)
     }
+    return Response(content=_set_log_stats_cache(cache_key, result), media_type="application/json")
 
 
 @router.get("/stats/logs/resource-types", summary="获取资源类型统计")
@@ -600,14 +601,22 @@ async def get_resource_type_stats(
 ):
     """
     获取资源类型统计信息
+    
+    统计结果以序列化后的JSON缓存60秒，命中时直接返回
     """
+    cache_key = f"{settings.CACHE_PREFIX}system:log_stats:resource:v1"
+    cached = get_cache(cache_key)
+    if cached:
+        return Response(content=cached, media_type="application/json")
+    
     # 统计各种资源类型的数量
     resource_stats = db.query(
         OperationLog.resource_type,
-        db.func.count(OperationLog.id)
+        func.count(OperationLog.id)
     ).group_by(OperationLog.resource_type).all()
     
-    return {
+    result = {
         "resource_types": dict(resource_stats),
         "total_resources": sum(count for _, count in resource_stats)
     }
+    return Response(content=_set_log_stats_cache(cache_key, result), media_type="application/json")
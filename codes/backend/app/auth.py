@@ -3,22 +3,44 @@
 处理JWT令牌、用户认证、密码哈希等功能
 """
 
+import logging
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Union
+import orjson
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from .database import get_db
+from .cache import get_cache, set_cache, delete_cache
 from .models.user import User, UserSession
 from .config import settings
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
-# HTTP Bearer认证
-security = HTTPBearer()
+# 密码加密上下文：新密码使用argon2，已有的bcrypt哈希仍可验证，并在登录成功时自动升级
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1
+)
+
+# HTTP Bearer认证：缺少或格式错误的Authorization头由get_current_user统一返回401
+security = HTTPBearer(auto_error=False)
+
+# 认证用户缓存时间（秒），用户信息变更时主动失效
+USER_CACHE_TTL = 60
+
+# 不写入缓存的敏感字段，需要时从数据库懒加载
+USER_CACHE_EXCLUDED_COLUMNS = frozenset({"password_hash"})
 
 
 class AuthManager:
@@ -29,45 +51,68 @@ class AuthManager:
         self.algorithm = settings.ALGORITHM
         self.access_token_expire_minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
         self.refresh_token_expire_days = settings.REFRESH_TOKEN_EXPIRE_DAYS
+        
+        # 签名密钥对象只构造一次，签发和验证令牌时不再逐次解析密钥
+        self._signing_key = jwk.construct(self.secret_key, self.algorithm)
+        
+        # 已验证令牌的解码结果缓存，同一令牌的重复请求跳过签名校验和JSON解析
+        self._token_cache = TTLCache(maxsize=8192, ttl=60)
+        self._token_cache_lock = threading.Lock()
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """验证密码"""
         return pwd_context.verify(plain_password, hashed_password)
     
+    def verify_and_update_password(self, plain_password: str, hashed_password: str):
+        """
+        验证密码，哈希算法或参数已过时时同时返回新的哈希
+        
+        Returns:
+            (是否验证通过, 新哈希或None)
+        """
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    
     def get_password_hash(self, password: str) -> str:
         """生成密码哈希"""
         return pwd_context.hash(password)
     
+    @staticmethod
+    def _login_column(login_name: str):
+        """根据登录名的形式判断对应的用户列：邮箱、手机号或用户名"""
+        if "@" in login_name:
+            return User.email
+        if login_name.lstrip("+").isdigit():
+            return User.phone
+        return User.username
+    
     def authenticate_user(self, db: Session, username: str, password: str) -> Optional[User]:
         """验证用户"""
-        print(f"=== 开始验证用户 ===")
-        print(f"输入的用户名/邮箱/手机号: {username}")
+        logger.debug("开始验证用户: %s", username)
         
-        # 支持用户名、邮箱或手机号登录
-        user = db.query(User).filter(
-            (User.username == username) | 
-            (User.email == username) | 
-            (User.phone == username)
-        ).first()
+        # 支持用户名、邮箱或手机号登录：按输入形式只查询对应的索引列，避免OR条件导致全表扫描
+        login_column = self._login_column(username)
+        user = db.query(User).filter(login_column == username).first()
         
-        print(f"数据库查询结果: {user}")
+        # 用户名未做格式限制，可能形如邮箱或纯数字，未命中时再按用户名查询
+        if not user and login_column is not User.username:
+            user = db.query(User).filter(User.username == username).first()
         
         if not user:
-            print(f"❌ 未找到用户: {username}")
+            logger.debug("未找到用户: %s", username)
             return None
         
-        print(f"✅ 找到用户: {user.username}")
-        print(f"用户密码哈希: {user.password_hash[:20]}...")
-        
         # 验证密码
-        password_valid = self.verify_password(password, user.password_hash)
-        print(f"密码验证结果: {'✅ 正确' if password_valid else '❌ 错误'}")
-        
+        password_valid, new_hash = self.verify_and_update_password(password, user.password_hash)
         if not password_valid:
-            print(f"❌ 密码验证失败")
+            logger.debug("密码验证失败: %s", username)
             return None
         
-        print(f"✅ 用户验证成功: {user.username}")
+        # 旧的bcrypt哈希在登录成功后升级为argon2
+        if new_hash:
+            user.password_hash = new_hash
+            db.commit()
+        
+        logger.debug("用户验证成功: %s", user.username)
         return user
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -80,7 +125,7 @@ class AuthManager:
             expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire_minutes)
         
         to_encode.update({"exp": expire, "type": "access"})
-        encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
+        encoded_jwt = jwt.encode(to_encode, self._signing_key, algorithm=self.algorithm)
         return encoded_jwt
     
     def create_refresh_token(self, data: dict) -> str:
@@ -88,20 +133,31 @@ class AuthManager:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=self.refresh_token_expire_days)
         to_encode.update({"exp": expire, "type": "refresh"})
-        encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
+        encoded_jwt = jwt.encode(to_encode, self._signing_key, algorithm=self.algorithm)
         return encoded_jwt
     
     def verify_token(self, token: str) -> dict:
         """验证令牌"""
+        with self._token_cache_lock:
+            cached = self._token_cache.get(token)
+        # 缓存命中时仍需检查令牌是否已过期
+        if cached is not None and cached.get("exp", 0) > time.time():
+            return dict(cached)
+        
         try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
+            payload = jwt.decode(token, self._signing_key, algorithms=[self.algorithm])
         except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="无效的令牌",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        
+        # 只缓存带过期时间的有效令牌
+        if "exp" in payload:
+            with self._token_cache_lock:
+                self._token_cache[token] = payload
+        return dict(payload)
     
     def create_user_session(self, db: Session, user_id: str, refresh_token: str, expires_at: datetime) -> UserSession:
         """创建用户会话"""
@@ -112,7 +168,6 @@ class AuthManager:
         )
         db.add(session)
         db.commit()
-        db.refresh(session)
         return session
     
     def delete_user_session(self, db: Session, access_token: str) -> bool:
@@ -136,11 +191,75 @@ class AuthManager:
 auth_manager = AuthManager()
 
 
+def _user_cache_key(user_id: str) -> str:
+    """认证用户缓存键"""
+    return f"{settings.CACHE_PREFIX}user:{user_id}"
+
+
+def _cache_user(user: User) -> None:
+    """把用户的列属性写入缓存"""
+    data = {
+        attr.key: getattr(user, attr.key)
+        for attr in inspect(User).column_attrs
+        if attr.key not in USER_CACHE_EXCLUDED_COLUMNS
+    }
+    set_cache(_user_cache_key(str(user.id)), orjson.dumps(data, default=str).decode("utf-8"), expire=USER_CACHE_TTL)
+
+
+def _restore_column_value(column, value):
+    """把缓存中的JSON值还原为列对应的Python类型"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is uuid.UUID:
+        return uuid.UUID(value)
+    return value
+
+
+def _get_cached_user(db: Session, user_id: str) -> Optional[User]:
+    """
+    从缓存中还原用户并挂到当前会话
+    
+    还原的对象按已持久化的游离对象处理，加入会话后不会触发查询，
+    后续修改照常随会话提交；未缓存的字段在访问时从数据库懒加载
+    """
+    cached = get_cache(_user_cache_key(user_id))
+    if not cached:
+        return None
+    
+    data = orjson.loads(cached)
+    user = User(**{
+        attr.key: _restore_column_value(attr.columns[0], data[attr.key])
+        for attr in inspect(User).column_attrs
+        if attr.key in data
+    })
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+def invalidate_user_cache(user_id: str) -> None:
+    """用户信息变更后使认证用户缓存失效"""
+    delete_cache(_user_cache_key(str(user_id)))
+
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
     """获取当前用户"""
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="未提供认证令牌",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     try:
         payload = auth_manager.verify_token(credentials.credentials)
         user_id: str = payload.get("sub")
@@ -161,14 +280,17 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # 获取用户信息
-        user = db.query(User).filter(User.id == user_id).first()
+        # 获取用户信息，优先读取缓存
+        user = _get_cached_user(db, user_id)
         if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="用户不存在",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="用户不存在",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            _cache_user(user)
         
         if not user.is_active:
             raise HTTPException(
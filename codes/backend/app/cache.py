@@ -1,10 +1,17 @@
 import redis
 import os
 from typing import Optional
+from .config import settings
 
 # Redis连接配置
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+# 本应用缓存键的统一前缀，清空缓存时只删除该前缀下的键
+CACHE_PREFIX = settings.CACHE_PREFIX
+
+# 清空缓存时每批扫描和删除的键数量
+CLEAR_CACHE_BATCH_SIZE = 1000
+
 # 创建Redis客户端
 redis_client = redis.from_url(REDIS_URL, decode_responses=True)
 
@@ -40,9 +47,22 @@ def delete_cache(key: str) -> bool:
         return False
 
 def clear_cache() -> bool:
-    """清空所有缓存"""
+    """
+    清空本应用的缓存
+    
+    按前缀SCAN分批查找键并用UNLINK异步删除，不阻塞Redis，也不影响共用该库的其他应用
+    """
     try:
-        redis_client.flushdb()
+        pipe = redis_client.pipeline(transaction=False)
+        batch = 0
+        for key in redis_client.scan_iter(match=f"{CACHE_PREFIX}*", count=CLEAR_CACHE_BATCH_SIZE):
+            pipe.unlink(key)
+            batch += 1
+            if batch >= CLEAR_CACHE_BATCH_SIZE:
+                pipe.execute()
+                batch = 0
+        if batch:
+            pipe.execute()
         return True
     except Exception as e:
         print(f"清空缓存失败: {e}")
@@ -3,24 +3,68 @@
 配置SQLAlchemy数据库连接和会话
 """
 
-from sqlalchemy import create_engine
+import asyncio
+import logging
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
 from contextlib import contextmanager
-from typing import Generator
+from typing import AsyncGenerator, Generator, Tuple
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
+# PgBouncer事务池模式下，pre_ping的SELECT 1会占住后端连接，且连接需在PgBouncer的
+# server_idle_timeout之前回收；直连PostgreSQL时保留原有配置
+POOL_PRE_PING = settings.DB_POOL_PRE_PING and not settings.DB_USE_PGBOUNCER
+POOL_RECYCLE = 60 if settings.DB_USE_PGBOUNCER else 3600
+
 # 创建数据库引擎
+# 默认QueuePool(5+10)在高并发下容易出现"QueuePool limit reached"超时，这里显式放大连接池
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_use_lifo=True,  # 优先复用最近归还的连接，空闲连接可被pool_recycle及时回收
+    pool_pre_ping=POOL_PRE_PING,
+    pool_recycle=POOL_RECYCLE,
     echo=settings.DEBUG,  # 在调试模式下打印SQL语句
 )
 
 # 创建会话工厂
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 提交后不使对象过期，接口返回时无需再refresh重新查询；
+# 服务端生成的默认值在INSERT时通过RETURNING取回
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# 创建异步数据库引擎（asyncpg驱动）
+# 使用异步会话的接口在事件循环中直接等待查询，不再占用线程池；连接池参数与同步引擎一致
+async_engine = create_async_engine(
+    make_url(settings.DATABASE_URL).set(drivername="postgresql+asyncpg"),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_use_lifo=True,
+    pool_pre_ping=POOL_PRE_PING,
+    pool_recycle=POOL_RECYCLE,
+    echo=settings.DEBUG,
+    # 事务池模式下同一会话的语句可能落到不同后端，不能使用预编译语句缓存
+    connect_args=(
+        {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "server_settings": {"jit": "off"},
+        }
+        if settings.DB_USE_PGBOUNCER else {}
+    ),
+)
+
+# 创建异步会话工厂
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 # 创建基础模型类
 Base = declarative_base()
@@ -30,19 +74,21 @@ def get_db() -> Generator[Session, None, None]:
     """
     获取数据库会话的依赖函数
     用于FastAPI的依赖注入
-"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    logger.debug(f"🔗 创建新的数据库会话...")
+    """
     db = SessionLocal()
     try:
-        logger.debug(f"✅ 数据库会话创建成功")
         yield db
     finally:
-        logger.debug(f"🔒 关闭数据库会话...")
         db.close()
-        logger.debug(f"✅ 数据库会话已关闭")
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    获取异步数据库会话的依赖函数
+    用于FastAPI的依赖注入，查询需使用select()风格并await执行
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
 
 
 @contextmanager
@@ -51,36 +97,26 @@ def get_db_context() -> Generator[Session, None, None]:
     获取数据库会话的上下文管理器
     用于手动管理数据库会话
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    logger.debug(f"🔗 创建数据库上下文会话...")
     db = SessionLocal()
     try:
-        logger.debug(f"✅ 数据库上下文会话创建成功")
         yield db
-        logger.debug(f"💾 提交数据库事务...")
         db.commit()
-        logger.debug(f"✅ 数据库事务提交成功")
     except Exception as e:
-        logger.error(f"❌ 数据库操作失败，开始回滚: {e}")
+        logger.error("❌ 数据库操作失败，事务已回滚: %s", e)
         db.rollback()
-        logger.error(f"🔄 数据库事务已回滚")
         raise
     finally:
-        logger.debug(f"🔒 关闭数据库上下文会话...")
         db.close()
-        logger.debug(f"✅ 数据库上下文会话已关闭")
 
 
 async def create_tables():
-    """创建所有数据库表"""
-    from .models import (
-        User, UserSession, Conversation, Message, 
-        Diagnosis, MedicalKnowledge, UserPreference, 
-        SystemConfig, OperationLog, MultimodalInput, MultimodalOutput
-    )
-    Base.metadata.create_all(bind=engine)
+    """
+    创建所有数据库表
+    
+    ORM模型在应用启动时由main模块导入并注册到元数据
+    """
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 
 def drop_tables():
@@ -88,12 +124,47 @@ def drop_tables():
     Base.metadata.drop_all(bind=engine)
 
 
+async def warm_up_connection_pools() -> Tuple[int, int]:
+    """
+    预热同步和异步连接池：两个池各自并发建立pool_size个连接后归还，
+    首批请求无需再等待建立连接
+    
+    Returns:
+        Tuple[int, int]: 同步池和异步池建立的连接数
+    """
+    sync_results, async_results = await asyncio.gather(
+        asyncio.gather(
+            *(asyncio.to_thread(engine.connect) for _ in range(engine.pool.size())),
+            return_exceptions=True
+        ),
+        asyncio.gather(
+            *(async_engine.connect().start() for _ in range(async_engine.sync_engine.pool.size())),
+            return_exceptions=True
+        ),
+    )
+    
+    sync_connections = [conn for conn in sync_results if not isinstance(conn, BaseException)]
+    async_connections = [conn for conn in async_results if not isinstance(conn, BaseException)]
+    
+    # 无论是否有连接失败，已建立的连接都归还到池中
+    await asyncio.gather(
+        *(asyncio.to_thread(conn.close) for conn in sync_connections),
+        *(conn.close() for conn in async_connections),
+    )
+    
+    for result in (*sync_results, *async_results):
+        if isinstance(result, BaseException):
+            raise result
+    
+    return len(sync_connections), len(async_connections)
+
+
 def check_database_connection() -> bool:
     """检查数据库连接是否正常"""
     try:
-        with get_db_context() as db:
-            from sqlalchemy import text
-            db.execute(text("SELECT 1"))
+        # 直接使用池中的连接执行，不创建ORM会话，也不提交事务
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         return True
     except Exception as e:
         print(f"数据库连接失败: {e}")
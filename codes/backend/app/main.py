@@ -3,38 +3,73 @@
 FastAPI主应用入口
 """
 
+import asyncio
 import time
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from contextlib import asynccontextmanager
+from typing import Awaitable
+from cachetools import TTLCache
 from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 
 from .config import settings
-from .database import create_tables, check_database_connection
+from .database import create_tables, check_database_connection, warm_up_connection_pools
 from .cache import redis_client
 from .api.v1 import api_router
+from .api.multimodal import init_multimodal_processors, shutdown_multimodal_processors
+from .services.audit_log_queue import AuditLogFlusher
+from . import models  # noqa: F401  导入时注册所有ORM模型，create_tables无需再导入
 from .models.base import Base
-from .database import engine
+from .database import engine, async_engine
 
 # 全局变量用于存储应用启动时间
 app_start_time = None
 
 # 配置日志
+# 请求处理中只把日志记录放入内存队列，控制台和文件的写入由后台线程完成，避免阻塞事件循环
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.StreamHandler(),  # 输出到控制台
+    logging.FileHandler(settings.LOG_FILE, encoding='utf-8')  # 输出到文件
+]
+for log_handler in log_handlers:
+    log_handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+
 logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL.upper()),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # 输出到控制台
-        logging.FileHandler(settings.LOG_FILE, encoding='utf-8')  # 输出到文件
-    ]
+    level=settings.LOG_LEVEL_INT,
+    handlers=[QueueHandler(log_queue)]
 )
 logger = logging.getLogger(__name__)
 
 
+def _ensure_database_connection():
+    """检查数据库连接，连接失败时抛出异常"""
+    if not check_database_connection():
+        raise ConnectionError("无法连接数据库")
+
+
+async def _run_startup_step(name: str, step: Awaitable):
+    """执行一个启动步骤并输出结果，失败时终止启动"""
+    try:
+        await step
+        logger.info(f"✅ {name}完成")
+        print(f"✅ {name}完成")
+    except Exception as e:
+        logger.error(f"❌ {name}失败: {e}")
+        print(f"❌ {name}失败: {e}")
+        raise
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -44,47 +79,51 @@ async def lifespan(app: FastAPI):
     
     # 启动时执行
     app_start_time = time.time()
+    log_listener.start()
     logger.info("🚀 智诊通系统启动中...")
     print("🚀 智诊通系统启动中...")
     
-    # 检查数据库连接
-    try:
-        check_database_connection()
-        logger.info("✅ 数据库连接正常")
-        print("✅ 数据库连接正常")
-    except Exception as e:
-        logger.error(f"❌ 数据库连接失败: {e}")
-        print(f"❌ 数据库连接失败: {e}")
-        raise
+    # 检查数据库连接、创建数据库表、检查Redis连接互不依赖，并发执行
+    await asyncio.gather(
+        _run_startup_step("数据库连接", asyncio.to_thread(_ensure_database_connection)),
+        _run_startup_step("数据库表创建", create_tables()),
+        _run_startup_step("Redis连接", asyncio.to_thread(redis_client.ping)),
+    )
     
-    # 创建数据库表
+    # 预热同步和异步数据库连接池，失败不影响启动
     try:
-        await create_tables()
-        logger.info("✅ 数据库表创建完成")
-        print("✅ 数据库表创建完成")
+        sync_warmed, async_warmed = await warm_up_connection_pools()
+        logger.info(f"✅ 数据库连接池预热完成: 同步 {sync_warmed} 个连接, 异步 {async_warmed} 个连接")
     except Exception as e:
-        logger.error(f"❌ 数据库表创建失败: {e}")
-        print(f"❌ 数据库表创建失败: {e}")
-        raise
+        logger.warning(f"⚠️ 数据库连接池预热失败: {e}")
     
-    # 检查Redis连接
-    try:
-        redis_client.ping()
-        logger.info("✅ Redis连接正常")
-        print("✅ Redis连接正常")
-    except Exception as e:
-        logger.error(f"❌ Redis连接失败: {e}")
-        print(f"❌ Redis连接失败: {e}")
-        raise
+    # 初始化多模态处理器（每个worker进程一份）
+    init_multimodal_processors(app)
+    logger.info("✅ 多模态处理器初始化完成")
+    
+    # 启动操作日志后台批量写入任务
+    app.state.audit_log_flusher = AuditLogFlusher()
+    app.state.audit_log_flusher.start()
     
     logger.info("🎉 智诊通系统启动完成!")
     print("🎉 智诊通系统启动完成!")
+    print(f"📖 API文档地址: http://localhost:{settings.SERVER_PORT}/docs")
+    print(f"🔍 健康检查: http://localhost:{settings.SERVER_PORT}/health")
     
     yield
     
     # 关闭时执行
     print("🔄 智诊通系统关闭中...")
     
+    # 停止多模态后台批处理任务
+    await shutdown_multimodal_processors(app)
+    
+    # 停止操作日志写入任务，并写入队列中剩余的日志
+    await app.state.audit_log_flusher.close()
+    
+    # 释放异步数据库连接池
+    await async_engine.dispose()
+    
     # 关闭Redis连接
     try:
         redis_client.close()
@@ -93,6 +132,9 @@ async def lifespan(app: FastAPI):
         print(f"❌ Redis连接关闭失败: {e}")
     
     print("👋 智诊通系统已关闭")
+    
+    # 写出队列中剩余的日志并停止后台日志线程
+    log_listener.stop()
 
 
 # 创建FastAPI应用实例
@@ -150,7 +192,8 @@ app = FastAPI(
     },
     docs_url=None,  # 禁用默认文档URL
     redoc_url=None,  # 禁用默认ReDoc URL
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -164,6 +207,19 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZip压缩中间件，跳过SSE流式接口，避免压缩缓冲导致事件延迟推送"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/stream"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# 添加GZip压缩中间件（仅压缩超过1KB的响应）
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1024)
+
 # 添加可信主机中间件
 app.add_middleware(
     TrustedHostMiddleware,
@@ -177,14 +233,15 @@ async def add_process_time_header(request: Request, call_next):
     """
     添加请求处理时间头和请求日志
     """
-    start_time = time.time()
+    # 处理耗时使用事件循环的单调时钟计算，不受系统时间调整影响
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
     
     # 记录请求信息
     logger.info(f"🔍 收到请求: {request.method} {request.url.path}")
-    logger.info(f"📋 请求头: {dict(request.headers)}")
     
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = loop.time() - start_time
     
     # 记录响应信息
     logger.info(f"✅ 响应状态: {response.status_code}, 处理时间: {process_time:.3f}s")
@@ -199,7 +256,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     """
     全局异常处理
     """
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "error": "内部服务器错误",
@@ -215,7 +272,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     """
     HTTP异常处理
     """
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
@@ -234,21 +291,17 @@ async def options_handler():
     return {"message": "OK"}
 
 
-# 健康检查端点
-@app.get("/health", summary="健康检查", tags=["系统"])
-@app.options("/health", include_in_schema=False)
-async def health_check():
-    """
-    系统健康检查
-    
-    返回系统运行状态和基本信息
-    """
-    global app_start_time
-    
+# 依赖服务的检查结果缓存5秒，频繁的存活探测不必每次都访问数据库和Redis
+health_status_cache = TTLCache(maxsize=1, ttl=5)
+
+
+def _check_services() -> dict:
+    """检查数据库和Redis连接状态"""
     # 检查数据库连接
     db_status = "healthy"
     try:
-        check_database_connection()
+        if not check_database_connection():
+            db_status = "unhealthy"
     except Exception:
         db_status = "unhealthy"
     
@@ -259,18 +312,38 @@ async def health_check():
     except Exception:
         redis_status = "unhealthy"
     
+    return {
+        "database": db_status,
+        "redis": redis_status
+    }
+
+
+# 健康检查端点
+@app.get("/health", summary="健康检查", tags=["系统"])
+@app.options("/health", include_in_schema=False)
+async def health_check():
+    """
+    系统健康检查
+    
+    返回系统运行状态和基本信息
+    """
+    global app_start_time
+    
+    services = health_status_cache.get("services")
+    if services is None:
+        services = await asyncio.to_thread(_check_services)
+        health_status_cache["services"] = services
+    
     # 计算运行时间
-    uptime = time.time() - app_start_time if app_start_time else 0
+    now = time.time()
+    uptime = now - app_start_time if app_start_time else 0
     
     return {
         "status": "healthy",
-        "timestamp": time.time(),
+        "timestamp": now,
         "uptime_seconds": uptime,
         "version": "1.0.0",
-        "services": {
-            "database": db_status,
-            "redis": redis_status
-        },
+        "services": services,
         "system_info": {
             "name": "智诊通-多模态智能医生问诊系统",
             "description": "基于AI技术的智能医疗问诊系统"
@@ -378,16 +451,6 @@ def custom_openapi():
 app.openapi = custom_openapi
 
 
-# 健康检查端点
-@app.get("/health")
-async def health_check():
-    """健康检查端点"""
-    return {
-        "status": "healthy",
-        "message": "智诊通系统运行正常",
-        "version": "1.0.0"
-    }
-
 # 注册API路由
 # 认证路由直接注册到根路径
 from .api.auth import router as auth_router
@@ -419,26 +482,6 @@ if settings.DEBUG:
         }
 
 
-# 启动事件
-@app.on_event("startup")
-async def startup_event():
-    """
-    应用启动事件
-    """
-    print("🎯 智诊通系统API服务已启动")
-    print(f"📖 API文档地址: http://localhost:{settings.SERVER_PORT}/docs")
-    print(f"🔍 健康检查: http://localhost:{settings.SERVER_PORT}/health")
-
-
-# 关闭事件
-@app.on_event("shutdown")
-async def shutdown_event():
-    """
-    应用关闭事件
-    """
-    print("🔄 智诊通系统API服务正在关闭...")
-
-
 # 如果直接运行此文件
 if __name__ == "__main__":
     import uvicorn
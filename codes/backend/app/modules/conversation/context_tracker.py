@@ -3,9 +3,13 @@
 跟踪和维护对话上下文信息
 """
 
+import re
+import threading
 import time
 from typing import Dict, Any, List, Optional
-from collections import defaultdict
+from cachetools import TTLCache
+
+from ...config import settings
 
 
 class ContextTracker:
@@ -13,8 +17,12 @@ class ContextTracker:
     
     def __init__(self):
         """初始化上下文跟踪器"""
-        self.stats = defaultdict(int)
-        self.conversation_contexts = {}  # 内存中的上下文存储
+        # 统计计数与上下文存储共用同一把锁，在已有的临界区内递增，线程池并发时也不会丢失计数
+        self._context_updates = 0
+        self._context_clears = 0
+        # 内存中的上下文存储：超过会话超时未更新或超出数量上限的上下文被淘汰，避免无限增长
+        self.conversation_contexts = TTLCache(maxsize=settings.MAX_CACHED_CONTEXTS, ttl=settings.SESSION_TIMEOUT)
+        self._contexts_lock = threading.Lock()
         
         # 症状关键词
         self.symptom_keywords = [
@@ -35,6 +43,20 @@ class ContextTracker:
             '严重': 3,
             '剧烈': 3
         }
+        
+        # 症状详情只在症状前后该字符数范围内查找严重程度和持续时间
+        self.detail_window = 20
+        
+        # 三类关键词合并预编译为一个正则，一次扫描即可得到所有命中及其类别；
+        # 较长的关键词排在前面，'昨天'等优先于其包含的'天'命中
+        self._keyword_categories = {
+            **{word: 'symptom' for word in self.symptom_keywords},
+            **{word: 'time' for word in self.time_keywords},
+            **{word: 'severity' for word in self.severity_keywords}
+        }
+        self._keyword_re = re.compile("|".join(
+            map(re.escape, sorted(self._keyword_categories, key=len, reverse=True))
+        ))
     
     def update_context(self, conversation_id: str, user_id: str, message: str, current_state: str) -> Dict[str, Any]:
         """
@@ -59,9 +81,9 @@ class ContextTracker:
         updated_context = self._merge_context(context, extracted_info, current_state)
         
         # 保存上下文
-        self.conversation_contexts[conversation_id] = updated_context
-        
-        self.stats['context_updates'] += 1
+        with self._contexts_lock:
+            self.conversation_contexts[conversation_id] = updated_context
+            self._context_updates += 1
         
         return updated_context
     
@@ -75,9 +97,14 @@ class ContextTracker:
         Returns:
             Dict[str, Any]: 对话上下文
         """
-        return self.conversation_contexts.get(conversation_id, {
+        with self._contexts_lock:
+            context = self.conversation_contexts.get(conversation_id)
+        if context is not None:
+            return context
+        
+        return {
             'user_id': None,
-            'symptoms': [],
+            'symptoms': set(),  # 以集合保存，合并时直接去重，序列化时再转为列表
             'symptom_details': {},
             'time_info': {},
             'severity': 'moderate',
@@ -85,12 +112,26 @@ class ContextTracker:
             'recommendations': [],
             'conversation_history': [],
             'last_update': None
-        })
+        }
+    
+    def export_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        把上下文转换为可序列化的形式，症状集合转为列表
+        
+        Args:
+            context: 对话上下文
+            
+        Returns:
+            Dict[str, Any]: 可序列化的上下文
+        """
+        return {**context, 'symptoms': list(context['symptoms'])}
     
     def _extract_information(self, message: str) -> Dict[str, Any]:
         """
         提取信息
         
+        对消息只扫描一次，得到按位置排序的关键词命中，再据此组装症状、时间和严重程度
+        
         Args:
             message: 用户消息
             
@@ -104,101 +145,85 @@ class ContextTracker:
             'severity': 'moderate'
         }
         
-        # 提取症状
-        for symptom in self.symptom_keywords:
-            if symptom in message:
-                extracted_info['symptoms'].append(symptom)
-                
-                # 提取症状详情
-                symptom_detail = self._extract_symptom_detail(message, symptom)
-                if symptom_detail:
-                    extracted_info['symptom_details'][symptom] = symptom_detail
+        hits = {'symptom': [], 'time': [], 'severity': []}
+        for match in self._keyword_re.finditer(message):
+            hits[self._keyword_categories[match.group()]].append(match)
+        
+        # 提取症状（按首次出现的顺序去重）
+        for symptom_match in hits['symptom']:
+            symptom = symptom_match.group()
+            if symptom in extracted_info['symptoms']:
+                continue
+            extracted_info['symptoms'].append(symptom)
+            
+            # 提取症状详情
+            symptom_detail = self._extract_symptom_detail(symptom_match, hits)
+            if symptom_detail:
+                extracted_info['symptom_details'][symptom] = symptom_detail
         
         # 提取时间信息
-        time_info = self._extract_time_info(message)
-        if time_info:
-            extracted_info['time_info'] = time_info
+        if hits['time']:
+            extracted_info['time_info'] = {'time_expression': hits['time'][0].group()}
         
         # 提取严重程度
-        severity = self._extract_severity(message)
-        if severity:
-            extracted_info['severity'] = severity
+        if hits['severity']:
+            extracted_info['severity'] = hits['severity'][0].group()
         
         return extracted_info
     
-    def _extract_symptom_detail(self, message: str, symptom: str) -> Dict[str, Any]:
+    def _extract_symptom_detail(self, symptom_match: re.Match, hits: Dict[str, List[re.Match]]) -> Dict[str, Any]:
         """
         提取症状详情
         
         Args:
-            message: 用户消息
-            symptom: 症状名称
+            symptom_match: 症状在消息中的命中
+            hits: 消息中各类关键词的命中，按位置排序
             
         Returns:
             Dict[str, Any]: 症状详情
         """
         detail = {}
         
-        # 查找症状在消息中的位置
-        symptom_pos = message.find(symptom)
-        if symptom_pos == -1:
-            return detail
+        # 症状前后窗口内距离最近的严重程度和持续时间
+        window_start = symptom_match.start() - self.detail_window
+        window_end = symptom_match.end() + self.detail_window
         
-        # 提取症状前后的描述
-        start_pos = max(0, symptom_pos - 20)
-        end_pos = min(len(message), symptom_pos + len(symptom) + 20)
-        context_text = message[start_pos:end_pos]
+        severity_match = self._nearest_hit(hits['severity'], symptom_match, window_start, window_end)
+        if severity_match:
+            detail['severity'] = severity_match.group()
+            detail['severity_level'] = self.severity_keywords[severity_match.group()]
         
-        # 提取严重程度
-        for severity_word, level in self.severity_keywords.items():
-            if severity_word in context_text:
-                detail['severity'] = severity_word
-                detail['severity_level'] = level
-                break
-        
-        # 提取持续时间
-        for time_word in self.time_keywords:
-            if time_word in context_text:
-                detail['duration'] = time_word
-                break
+        time_match = self._nearest_hit(hits['time'], symptom_match, window_start, window_end)
+        if time_match:
+            detail['duration'] = time_match.group()
         
         return detail
     
-    def _extract_time_info(self, message: str) -> Dict[str, Any]:
+    @staticmethod
+    def _nearest_hit(matches: List[re.Match], anchor: re.Match, window_start: int, window_end: int) -> Optional[re.Match]:
         """
-        提取时间信息
+        在窗口内查找距离anchor最近的命中
         
         Args:
-            message: 用户消息
+            matches: 同一类别的命中，按位置排序
+            anchor: 作为参照的命中
+            window_start: 窗口起始位置
+            window_end: 窗口结束位置
             
         Returns:
-            Dict[str, Any]: 时间信息
+            Optional[re.Match]: 最近的命中，窗口内没有时返回None
         """
-        time_info = {}
-        
-        # 提取时间表达
-        for time_word in self.time_keywords:
-            if time_word in message:
-                time_info['time_expression'] = time_word
+        nearest = None
+        nearest_distance = None
+        for match in matches:
+            if match.start() < window_start:
+                continue
+            if match.end() > window_end:
                 break
-        
-        return time_info
-    
-    def _extract_severity(self, message: str) -> Optional[str]:
-        """
-        提取严重程度
-        
-        Args:
-            message: 用户消息
-            
-        Returns:
-            Optional[str]: 严重程度
-        """
-        for severity_word in self.severity_keywords:
-            if severity_word in message:
-                return severity_word
-        
-        return None
+            distance = max(anchor.start() - match.end(), match.start() - anchor.end(), 0)
+            if nearest_distance is None or distance < nearest_distance:
+                nearest, nearest_distance = match, distance
+        return nearest
     
     def _merge_context(self, current_context: Dict[str, Any], new_info: Dict[str, Any], state: str) -> Dict[str, Any]:
         """
@@ -214,10 +239,8 @@ class ContextTracker:
         """
         merged_context = current_context.copy()
         
-        # 合并症状
-        if new_info['symptoms']:
-            merged_context['symptoms'].extend(new_info['symptoms'])
-            merged_context['symptoms'] = list(set(merged_context['symptoms']))  # 去重
+        # 合并症状（集合自动去重）
+        merged_context['symptoms'].update(new_info['symptoms'])
         
         # 合并症状详情
         merged_context['symptom_details'].update(new_info['symptom_details'])
@@ -253,9 +276,9 @@ class ContextTracker:
         Args:
             conversation_id: 对话ID
         """
-        if conversation_id in self.conversation_contexts:
-            del self.conversation_contexts[conversation_id]
-            self.stats['context_clears'] += 1
+        with self._contexts_lock:
+            if self.conversation_contexts.pop(conversation_id, None) is not None:
+                self._context_clears += 1
     
     def get_context_summary(self, conversation_id: str) -> Dict[str, Any]:
         """
@@ -270,8 +293,8 @@ class ContextTracker:
         context = self.get_context(conversation_id)
         
         summary = {
-            'total_symptoms': len(context.get('symptoms', [])),
-            'symptoms': context.get('symptoms', []),
+            'total_symptoms': len(context.get('symptoms', ())),
+            'symptoms': list(context.get('symptoms', ())),
             'severity': context.get('severity', 'moderate'),
             'has_diagnosis': bool(context.get('diagnosis')),
             'has_recommendations': bool(context.get('recommendations')),
@@ -287,8 +310,10 @@ class ContextTracker:
         Returns:
             Dict[str, Any]: 统计信息
         """
-        return {
-            'total_conversations': len(self.conversation_contexts),
-            'context_updates': self.stats['context_updates'],
-            'context_clears': self.stats['context_clears']
-        }
+        with self._contexts_lock:
+            self.conversation_contexts.expire()
+            return {
+                'total_conversations': len(self.conversation_contexts),
+                'context_updates': self._context_updates,
+                'context_clears': self._context_clears
+            }
@@ -107,13 +107,11 @@ class ConversationHistoryManager:
         end_time = history[-1]['timestamp']
         duration = end_time - start_time
         
-        # 统计状态
-        states = [msg['state'] for msg in history]
-        unique_states = list(set(states))
+        # 统计状态（集合推导一次遍历去重，不构造中间列表）
+        unique_states = list({msg['state'] for msg in history})
         
         # 统计用户消息长度
-        user_message_lengths = [len(msg['user_message']) for msg in history]
-        avg_message_length = sum(user_message_lengths) / len(user_message_lengths) if user_message_lengths else 0
+        avg_message_length = sum(len(msg['user_message']) for msg in history) / message_count
         
         return {
             'conversation_id': conversation_id,
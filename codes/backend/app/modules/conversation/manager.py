@@ -93,7 +93,7 @@ class ConversationManager:
             conversation_id=conversation_id,
             response=response,
             state=new_state,
-            context=context,
+            context=self.context_tracker.export_context(context),
             processing_time=processing_time
         )
     
@@ -178,7 +178,7 @@ class ConversationManager:
         Returns:
             Dict[str, Any]: 对话上下文
         """
-        return self.context_tracker.get_context(conversation_id)
+        return self.context_tracker.export_context(self.context_tracker.get_context(conversation_id))
     
     def get_conversation_state(self, conversation_id: str) -> str:
         """
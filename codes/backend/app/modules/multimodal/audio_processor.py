@@ -3,6 +3,7 @@
 处理音频输入，包括语音识别、情感分析等
 """
 
+import random
 import time
 from typing import Dict, Any, List
 from collections import defaultdict
@@ -95,8 +96,6 @@ class AudioProcessor:
         """
         # 模拟语音识别
         # 实际实现中会调用Whisper或其他语音识别模型
-        
-        import random
         return random.choice(self.mock_transcriptions)
     
     def _identify_speaker(self, audio_data: bytes) -> Dict[str, Any]:
@@ -128,7 +127,6 @@ class AudioProcessor:
             str: 情感类型
         """
         # 模拟情感分析
-        import random
         emotions = ['neutral', 'happy', 'sad', 'angry', 'anxious', 'calm']
         return random.choice(emotions)
     
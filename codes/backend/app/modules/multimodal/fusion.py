@@ -3,6 +3,7 @@
 融合多种模态的信息
 """
 
+import heapq
 import time
 from typing import Dict, Any, List
 from collections import defaultdict
@@ -114,7 +115,8 @@ class ModalityFusion:
         Returns:
             Dict[str, Any]: 融合后的信息
         """
-        fused_data = aligned_data.copy()
+        # 对齐结果由本流程独占，各阶段直接原地更新，不再逐级复制
+        fused_data = aligned_data
         
         # 实体去重和合并
         unique_entities = {}
@@ -158,7 +160,7 @@ class ModalityFusion:
         Returns:
             Dict[str, Any]: 冲突解决后的数据
         """
-        resolved_data = fused_data.copy()
+        resolved_data = fused_data
         
         # 处理情感冲突
         sentiments = []
@@ -193,18 +195,15 @@ class ModalityFusion:
         Returns:
             Dict[str, Any]: 优化后的结果
         """
-        optimized_data = resolved_data.copy()
+        optimized_data = resolved_data
         
-        # 按置信度排序实体
-        optimized_data['entities'] = sorted(
+        # 按置信度取前10个实体，结果与完整排序后截断一致
+        optimized_data['entities'] = heapq.nlargest(
+            10,
             optimized_data['entities'],
-            key=lambda x: x.get('confidence', 0.0),
-            reverse=True
+            key=lambda x: x.get('confidence', 0.0)
         )
         
-        # 限制实体数量
-        optimized_data['entities'] = optimized_data['entities'][:10]
-        
         # 确保置信度在合理范围内
         optimized_data['confidence'] = max(0.0, min(1.0, optimized_data['confidence']))
         
@@ -42,17 +42,20 @@ class ImageProcessor:
         # 图像预处理
         processed_image = self._preprocess_image(image_data)
         
+        # 全图统计量只计算一次，供后续各步骤复用
+        image_stats = self._compute_image_stats(processed_image)
+        
         # 对象检测
-        detected_objects = self._detect_objects(processed_image)
+        detected_objects = self._detect_objects(image_stats)
         
         # 图像分类
-        image_category = self._classify_image(processed_image)
+        image_category = self._classify_image(image_stats)
         
         # 特征提取
-        image_features = self._extract_features(processed_image)
+        image_features = self._extract_features(processed_image, image_stats)
         
         # 异常检测
-        anomalies = self._detect_anomalies(processed_image)
+        anomalies = self._detect_anomalies(image_stats)
         
         processing_time = time.time() - start_time
         
@@ -82,13 +85,31 @@ class ImageProcessor:
         
         return image_array
     
-    def _detect_objects(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def _compute_image_stats(self, image: np.ndarray) -> Dict[str, float]:
+        """
+        计算全图均值、方差和标准差
+        
+        Args:
+            image: 图像数组
+            
+        Returns:
+            Dict[str, float]: 全图统计量
+        """
+        mean = float(image.mean(dtype=np.float64))
+        var = float(image.var(dtype=np.float64))
+        return {
+            'mean': mean,
+            'var': var,
+            'std': var ** 0.5
+        }
+    
+    def _detect_objects(self, image_stats: Dict[str, float]) -> List[Dict[str, Any]]:
         """对象检测"""
         # 模拟对象检测结果
         objects = []
         
         # 基于图像特征生成模拟检测结果
-        if np.mean(image) > 128:
+        if image_stats['mean'] > 128:
             objects.append({
                 'label': '正常组织',
                 'confidence': 0.85,
@@ -105,13 +126,13 @@ class ImageProcessor:
         
         return objects
     
-    def _classify_image(self, image: np.ndarray) -> Dict[str, Any]:
+    def _classify_image(self, image_stats: Dict[str, float]) -> Dict[str, Any]:
         """图像分类"""
         # 模拟图像分类
         categories = list(self.medical_categories.keys())
         
         # 基于图像特征进行分类
-        image_mean = np.mean(image)
+        image_mean = image_stats['mean']
         category_index = int(image_mean / 255 * len(categories)) % len(categories)
         selected_category = categories[category_index]
         
@@ -125,19 +146,21 @@ class ImageProcessor:
             ]
         }
     
-    def _extract_features(self, image: np.ndarray) -> Dict[str, Any]:
+    def _extract_features(self, image: np.ndarray, image_stats: Dict[str, float]) -> Dict[str, Any]:
         """特征提取"""
         # 模拟特征提取
         features = {
             'color_features': {
                 'mean_rgb': np.mean(image, axis=(0, 1)).tolist(),
                 'std_rgb': np.std(image, axis=(0, 1)).tolist(),
-                'histogram': np.histogram(image.flatten(), bins=256)[0].tolist()[:10]
+                # uint8像素直接按灰度值计数，无需排序分箱和拷贝
+                'histogram': np.bincount(image.ravel(), minlength=256)[:10].tolist()
             },
             'texture_features': {
-                'contrast': np.std(image),
-                'homogeneity': 1.0 / (1.0 + np.var(image)),
-                'energy': np.mean(image ** 2)
+                'contrast': image_stats['std'],
+                'homogeneity': 1.0 / (1.0 + image_stats['var']),
+                # E[x²] = Var(x) + E[x]²，避免uint8平方溢出和整图临时数组
+                'energy': image_stats['var'] + image_stats['mean'] ** 2
             },
             'shape_features': {
                 'aspect_ratio': image.shape[1] / image.shape[0],
@@ -149,13 +172,13 @@ class ImageProcessor:
         
         return features
     
-    def _detect_anomalies(self, image: np.ndarray) -> List[Dict[str, Any]]:
+    def _detect_anomalies(self, image_stats: Dict[str, float]) -> List[Dict[str, Any]]:
         """异常检测"""
         # 模拟异常检测
         anomalies = []
         
         # 基于图像统计特征检测异常
-        image_std = np.std(image)
+        image_std = image_stats['std']
         if image_std > 50:
             anomalies.append({
                 'type': 'high_variance',
@@ -165,7 +188,7 @@ class ImageProcessor:
             })
         
         # 检测亮度异常
-        image_mean = np.mean(image)
+        image_mean = image_stats['mean']
         if image_mean < 50 or image_mean > 200:
             anomalies.append({
                 'type': 'brightness_anomaly',
@@ -0,0 +1,67 @@
+"""
+多模态处理进程池
+不释放GIL的音频、图像解码与分析放到独立进程中执行，处理器在每个子进程中只初始化一次
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
+
+from .audio_processor import AudioProcessor
+from .image_processor import ImageProcessor
+
+# 子进程内的处理器实例，由进程池initializer创建，在该进程的整个生命周期内复用
+_audio_processor: Optional[AudioProcessor] = None
+_image_processor: Optional[ImageProcessor] = None
+
+
+def _init_worker():
+    """子进程初始化：加载处理器（及其模型状态）"""
+    global _audio_processor, _image_processor
+    _audio_processor = AudioProcessor()
+    _image_processor = ImageProcessor()
+
+
+def run_audio(audio_data: bytes) -> Dict[str, Any]:
+    """
+    在子进程中执行音频处理
+
+    Args:
+        audio_data: 音频原始字节
+
+    Returns:
+        Dict[str, Any]: AudioProcessor.process_audio返回的结果字典
+    """
+    return _audio_processor.process_audio(audio_data)
+
+
+def run_image(image_data: bytes) -> Dict[str, Any]:
+    """
+    在子进程中执行图像处理
+
+    Args:
+        image_data: 图像原始字节
+
+    Returns:
+        Dict[str, Any]: ImageProcessor.process_image返回的结果字典
+    """
+    return _image_processor.process_image(image_data)
+
+
+def create_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    创建多模态处理进程池
+
+    Args:
+        max_workers: 子进程数量
+
+    Returns:
+        ProcessPoolExecutor: 进程池，应用关闭时需调用shutdown
+    """
+    # 主进程已运行事件循环、日志队列等线程，fork出的子进程可能继承被持有的锁，
+    # 改用spawn启动全新的解释器
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    )
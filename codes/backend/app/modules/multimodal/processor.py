@@ -52,36 +52,55 @@ class MultimodalProcessor:
         """
         start_time = time.time()
         
-        # 初始化处理结果
+        # 依次处理文本、音频、图像输入
         processed_results = {}
-        modality_info = {}
-        
-        # 处理文本输入
-        if input_data.text_data:
-            text_result = self.text_processor.process_text(input_data.text_data)
-            processed_results['text'] = text_result
-            modality_info['text'] = {
-                'processed': True,
-                'confidence': text_result.get('confidence', 0.0)
-            }
+        for modality, data in (
+            ('text', input_data.text_data),
+            ('audio', input_data.audio_data),
+            ('image', input_data.image_data)
+        ):
+            if data:
+                processed_results[modality] = self.process_modality(modality, data)
+        
+        return self.build_output(processed_results, start_time)
+    
+    def process_modality(self, modality: str, data: Any) -> Dict[str, Any]:
+        """
+        处理单一模态的输入，供流式接口逐个模态并发处理
         
-        # 处理音频输入
-        if input_data.audio_data:
-            audio_result = self.audio_processor.process_audio(input_data.audio_data)
-            processed_results['audio'] = audio_result
-            modality_info['audio'] = {
-                'processed': True,
-                'confidence': audio_result.get('confidence', 0.0)
-            }
+        Args:
+            modality: 模态类型（text/audio/image）
+            data: 该模态的输入数据
+            
+        Returns:
+            Dict[str, Any]: 该模态的处理结果
+        """
+        if modality == 'text':
+            return self.text_processor.process_text(data)
+        if modality == 'audio':
+            return self.audio_processor.process_audio(data)
+        if modality == 'image':
+            return self.image_processor.process_image(data)
+        raise ValueError(f"不支持的模态类型: {modality}")
+    
+    def build_output(self, processed_results: Dict[str, Dict[str, Any]], start_time: float) -> MultimodalOutput:
+        """
+        融合各模态的处理结果并生成最终输出
         
-        # 处理图像输入
-        if input_data.image_data:
-            image_result = self.image_processor.process_image(input_data.image_data)
-            processed_results['image'] = image_result
-            modality_info['image'] = {
+        Args:
+            processed_results: 各模态的处理结果
+            start_time: 处理开始时间
+            
+        Returns:
+            MultimodalOutput: 处理结果
+        """
+        modality_info = {
+            modality: {
                 'processed': True,
-                'confidence': image_result.get('confidence', 0.0)
+                'confidence': result.get('confidence', 0.0)
             }
+            for modality, result in processed_results.items()
+        }
         
         # 多模态融合
         if len(processed_results) > 1:
@@ -139,7 +139,7 @@ class QueryUnderstanding:
             matches = re.findall(pattern, query)
             keywords.extend(matches)
         
-        return list(set(keywords))  # 去重
+        return list(dict.fromkeys(keywords))  # 去重，保留出现顺序
     
     def _expand_query(self, query: str, keywords: List[str]) -> str:
         """
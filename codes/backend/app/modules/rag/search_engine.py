@@ -64,6 +64,10 @@ class RetrievalEngine:
                 'vector': np.random.randn(768)
             }
         ]
+        
+        # 知识库向量矩阵及其范数，供批量检索一次矩阵乘法计算相似度
+        self.knowledge_matrix = np.stack([item['vector'] for item in self.knowledge_base])
+        self.knowledge_norms = np.linalg.norm(self.knowledge_matrix, axis=1)
     
     def retrieve(self, query_vector: np.ndarray, query_text: str, top_k: int = 5, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -100,6 +104,22 @@ class RetrievalEngine:
             'total_found': len(optimized_results)
         }
     
+    def _batch_similarity(self, query_vectors: np.ndarray) -> np.ndarray:
+        """
+        批量计算查询向量与知识库向量的余弦相似度
+        
+        Args:
+            query_vectors: 查询向量矩阵，形状为 (N, D)
+            
+        Returns:
+            np.ndarray: 相似度矩阵，形状为 (N, 知识库大小)
+        """
+        dot_products = query_vectors @ self.knowledge_matrix.T
+        norms = np.outer(np.linalg.norm(query_vectors, axis=1), self.knowledge_norms)
+        
+        # 零向量的相似度记为0，与_calculate_similarity一致
+        return np.divide(dot_products, norms, out=np.zeros_like(dot_products), where=norms != 0)
+    
     def _vector_retrieve(self, query_vector: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
         """
         向量检索
@@ -111,22 +131,38 @@ class RetrievalEngine:
         Returns:
             List[Dict[str, Any]]: 检索结果
         """
-        results = []
+        # 与整个知识库的相似度由一次矩阵运算得到
+        similarities = self._batch_similarity(query_vector[np.newaxis, :])[0]
+        return self._top_k_results(similarities, top_k)
+    
+    def _top_k_results(self, similarities: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        """
+        按相似度选出top_k条知识
         
-        for item in self.knowledge_base:
-            # 计算相似度
-            similarity = self._calculate_similarity(query_vector, item['vector'])
+        先用argpartition在线性时间内选出候选，只对这top_k条排序
+        
+        Args:
+            similarities: 查询与知识库各条目的相似度
+            top_k: 返回结果数量
             
-            results.append({
-                'item': item,
-                'similarity': similarity,
-                'score': similarity
-            })
+        Returns:
+            List[Dict[str, Any]]: 按相似度降序排列的检索结果
+        """
+        top_k = min(top_k, len(similarities))
+        if top_k <= 0:
+            return []
         
-        # 按相似度排序
-        results.sort(key=lambda x: x['similarity'], reverse=True)
+        top_indices = np.argpartition(-similarities, top_k - 1)[:top_k]
+        top_indices = top_indices[np.argsort(-similarities[top_indices], kind='stable')]
         
-        return results[:top_k]
+        return [
+            {
+                'item': self.knowledge_base[index],
+                'similarity': float(similarities[index]),
+                'score': float(similarities[index])
+            }
+            for index in top_indices
+        ]
     
     def _hybrid_retrieve(self, query_text: str, vector_results: List[Dict[str, Any]], filters: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
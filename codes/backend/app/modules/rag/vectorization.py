@@ -3,10 +3,12 @@
 处理文档和查询的向量化
 """
 
+import threading
 import time
 import numpy as np
 from typing import Dict, Any, List
 from collections import defaultdict
+from cachetools import LRUCache
 
 
 class VectorizationProcessor:
@@ -17,6 +19,11 @@ class VectorizationProcessor:
         self.stats = defaultdict(int)
         self.vector_dimension = 768  # 向量维度
         
+        # 查询向量缓存：线上查询分布长尾集中，重复查询直接复用已编码的向量
+        self.query_vector_cache = LRUCache(maxsize=4096)
+        # LRUCache的读取也会调整淘汰顺序，多线程访问缓存和统计时需要加锁
+        self._cache_lock = threading.Lock()
+        
         # 模拟词向量
         self.word_vectors = {
             '发热': np.random.randn(self.vector_dimension),
@@ -83,7 +90,8 @@ class VectorizationProcessor:
             np.ndarray: 查询向量
         """
         start_time = time.time()
-        self.stats['total_queries_processed'] += 1
+        with self._cache_lock:
+            self.stats['total_queries_processed'] += 1
         
         # 查询向量化
         query_vector = self._encode_query(query)
@@ -92,7 +100,8 @@ class VectorizationProcessor:
         optimized_vector = self._optimize_vector(query_vector)
         
         processing_time = time.time() - start_time
-        self.stats['total_processing_time'] += processing_time
+        with self._cache_lock:
+            self.stats['total_processing_time'] += processing_time
         
         return optimized_vector
     
@@ -136,16 +145,23 @@ class VectorizationProcessor:
     
     def _encode_query(self, query: str) -> np.ndarray:
         """
-        编码查询
+        编码查询，结果按规范化后的查询文本缓存
         
         Args:
             query: 查询文本
             
         Returns:
-            np.ndarray: 查询向量
+            np.ndarray: 查询向量（只读，调用方不应原地修改）
         """
-        # 分词并计算向量
+        # 分词并按规范化文本查找缓存；词表匹配区分大小写，缓存键同样保留大小写
         words = query.split()
+        cache_key = " ".join(words)
+        with self._cache_lock:
+            cached_vector = self.query_vector_cache.get(cache_key)
+            if cached_vector is not None:
+                self.stats['query_cache_hits'] += 1
+                return cached_vector
+        
         word_vectors = []
         
         for word in words:
@@ -162,6 +178,10 @@ class VectorizationProcessor:
         # 归一化
         query_vector = query_vector / (np.linalg.norm(query_vector) + 1e-8)
         
+        query_vector.setflags(write=False)
+        with self._cache_lock:
+            self.query_vector_cache[cache_key] = query_vector
+        
         return query_vector
     
     def _optimize_vectors(self, vectors: List[np.ndarray]) -> List[np.ndarray]:
@@ -266,5 +286,7 @@ class VectorizationProcessor:
                 (self.stats['total_documents_processed'] + self.stats['total_queries_processed'])
                 if (self.stats['total_documents_processed'] + self.stats['total_queries_processed']) > 0 else 0
             ),
-            'vector_dimension': self.vector_dimension
+            'vector_dimension': self.vector_dimension,
+            'query_cache_hits': self.stats['query_cache_hits'],
+            'query_cache_size': len(self.query_vector_cache)
         }
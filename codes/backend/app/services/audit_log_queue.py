@@ -0,0 +1,249 @@
+"""
+操作日志写缓冲队列
+请求路径只把日志写入Redis列表，由后台任务定期批量写入数据库
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import orjson
+from sqlalchemy import inspect
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from ..cache import redis_client
+from ..database import get_db_context
+from ..models.log import OperationLog
+
+logger = logging.getLogger(__name__)
+
+# 待写入的操作日志队列，新日志从左端压入，后台任务从右端按写入顺序取出；
+# 队列保存的是尚未落库的数据而不是缓存，不能使用缓存前缀，否则clear_cache会把它一并删除
+AUDIT_QUEUE_KEY = "audit:queue"
+
+# 已从主队列取出、正在写入数据库的日志；事务提交后才从这里删除，
+# 进程在写入途中退出时，启动阶段把残留的日志放回主队列重新写入
+AUDIT_PROCESSING_KEY = "audit:processing"
+
+# 无法写入数据库的操作日志（如字段不合法）移入死信队列，留待人工排查，不再阻塞主队列
+AUDIT_DEAD_LETTER_KEY = "audit:dead_letter"
+
+# 数据库连接类错误：整批放回队列等待重试，而不是按数据错误逐条处理
+DB_UNAVAILABLE_ERRORS = (OperationalError, InterfaceError)
+
+# 单批写入数据库的最大日志条数
+AUDIT_FLUSH_BATCH_SIZE = 500
+
+# 后台写入间隔（秒）
+AUDIT_FLUSH_INTERVAL = 1.0
+
+
+def enqueue_operation_log(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把操作日志压入写缓冲队列
+
+    id和created_at在入队时生成，调用方可以立即返回完整的日志记录
+
+    Args:
+        data: 操作日志字段
+
+    Returns:
+        Dict[str, Any]: 带id和created_at的日志记录
+    """
+    log = {**data, "id": uuid.uuid4(), "created_at": datetime.utcnow()}
+    redis_client.lpush(AUDIT_QUEUE_KEY, orjson.dumps(log, default=str).decode("utf-8"))
+    return log
+
+
+def _restore_log_row(raw: str) -> Dict[str, Any]:
+    """把队列中的JSON日志还原为OperationLog列对应的Python类型"""
+    data = orjson.loads(raw)
+    for column in inspect(OperationLog).columns:
+        value = data.get(column.key)
+        if value is None:
+            continue
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            continue
+        if python_type is datetime:
+            data[column.key] = datetime.fromisoformat(value)
+        elif python_type is uuid.UUID:
+            data[column.key] = uuid.UUID(value)
+    return data
+
+
+def _pop_batch(batch_size: int) -> List[str]:
+    """
+    把队列右端最早写入的一批日志逐条移入处理中列表
+    
+    每条日志由LMOVE原子地移动，取出后进程退出也不会丢失
+    
+    Returns:
+        List[str]: 按写入顺序排列的日志
+    """
+    pending = redis_client.llen(AUDIT_QUEUE_KEY)
+    if not pending:
+        return []
+    
+    pipe = redis_client.pipeline(transaction=False)
+    for _ in range(min(batch_size, pending)):
+        pipe.lmove(AUDIT_QUEUE_KEY, AUDIT_PROCESSING_KEY, "RIGHT", "LEFT")
+    # 其他进程可能同时取走部分日志，此时对应的LMOVE返回None
+    return [raw for raw in pipe.execute() if raw is not None]
+
+
+def _ack_batch(raw_logs: List[str]):
+    """事务提交后把这批日志从处理中列表删除"""
+    pipe = redis_client.pipeline(transaction=True)
+    for raw in raw_logs:
+        pipe.lrem(AUDIT_PROCESSING_KEY, 1, raw)
+    pipe.execute()
+
+
+def _requeue_batch(raw_logs: List[str]):
+    """数据库不可用时把这批日志从处理中列表放回队列右端，下次按原顺序重试"""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.rpush(AUDIT_QUEUE_KEY, *reversed(raw_logs))
+    for raw in raw_logs:
+        pipe.lrem(AUDIT_PROCESSING_KEY, 1, raw)
+    pipe.execute()
+
+
+def recover_processing_logs() -> int:
+    """
+    把上次进程退出时残留在处理中列表的日志放回队列右端
+    
+    处理中列表左端是最晚取出的日志，从左端依次移到队列右端后，
+    最早写入的日志仍位于队列最右端，会被最先写入。
+    已提交但未来得及删除的日志会因主键冲突移入死信队列，不会重复落库
+    
+    Returns:
+        int: 放回队列的日志条数
+    """
+    recovered = 0
+    while redis_client.lmove(AUDIT_PROCESSING_KEY, AUDIT_QUEUE_KEY, "LEFT", "RIGHT") is not None:
+        recovered += 1
+    return recovered
+
+
+def _insert_rows_individually(raw_logs: List[str]) -> int:
+    """
+    逐条写入一批日志，每条使用独立的SAVEPOINT，写入失败的日志移入死信队列
+    
+    Returns:
+        int: 写入成功的日志条数
+    """
+    dead_letters = []
+    with get_db_context() as db:
+        for raw in raw_logs:
+            try:
+                with db.begin_nested():
+                    db.bulk_insert_mappings(OperationLog, [_restore_log_row(raw)])
+            except DB_UNAVAILABLE_ERRORS:
+                raise
+            except Exception as e:
+                logger.error(f"操作日志写入失败，移入死信队列: {e}，日志: {raw}")
+                dead_letters.append(raw)
+    
+    if dead_letters:
+        redis_client.lpush(AUDIT_DEAD_LETTER_KEY, *dead_letters)
+    return len(raw_logs) - len(dead_letters)
+
+
+def _insert_batch(raw_logs: List[str]) -> int:
+    """
+    批量写入一批日志；批内有无法写入的日志时改为逐条写入
+    
+    Returns:
+        int: 写入成功的日志条数
+    """
+    try:
+        with get_db_context() as db:
+            db.bulk_insert_mappings(OperationLog, [_restore_log_row(raw) for raw in raw_logs])
+        return len(raw_logs)
+    except DB_UNAVAILABLE_ERRORS:
+        raise
+    except Exception as e:
+        logger.warning(f"批量写入操作日志失败，改为逐条写入: {e}")
+        return _insert_rows_individually(raw_logs)
+
+
+def flush_operation_logs(batch_size: int = AUDIT_FLUSH_BATCH_SIZE) -> int:
+    """
+    把队列中的操作日志批量写入数据库，直到队列为空
+    
+    取出的日志先移入处理中列表，事务提交后才删除；
+    数据库不可用时整批放回队列右端，下次按原顺序重试；
+    个别日志无法写入时移入死信队列，不会阻塞后续日志
+    
+    Returns:
+        int: 写入的日志条数
+    """
+    total = 0
+    while True:
+        raw_logs = _pop_batch(batch_size)
+        if not raw_logs:
+            return total
+        
+        try:
+            total += _insert_batch(raw_logs)
+        except DB_UNAVAILABLE_ERRORS:
+            _requeue_batch(raw_logs)
+            raise
+        _ack_batch(raw_logs)
+        
+        if len(raw_logs) < batch_size:
+            return total
+
+
+class AuditLogFlusher:
+    """操作日志后台写入任务"""
+
+    def __init__(self, interval: float = AUDIT_FLUSH_INTERVAL):
+        """
+        Args:
+            interval: 两次写入之间的间隔（秒）
+        """
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """在当前事件循环中启动后台写入任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """停止后台写入任务，并把队列中剩余的日志写入数据库"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        try:
+            await asyncio.to_thread(flush_operation_logs)
+        except Exception as e:
+            logger.error(f"关闭时写入操作日志失败: {e}")
+
+    async def _run(self):
+        """后台循环：先恢复上次残留的处理中日志，再定期把队列中的日志批量写入数据库"""
+        try:
+            recovered = await asyncio.to_thread(recover_processing_logs)
+            if recovered:
+                logger.warning(f"恢复上次未写入完成的操作日志 {recovered} 条")
+        except Exception as e:
+            logger.error(f"恢复处理中的操作日志失败: {e}")
+
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                flushed = await asyncio.to_thread(flush_operation_logs)
+                if flushed:
+                    logger.debug(f"写入操作日志 {flushed} 条")
+            except Exception as e:
+                logger.error(f"批量写入操作日志失败: {e}")
@@ -34,6 +34,9 @@ class RAGService:
             limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
         )
         self.is_available_flag = None
+        # 可用性检查结果的缓存时间（秒），避免每个请求都先访问一次/health
+        self.availability_ttl = float(os.getenv("RAG_AVAILABILITY_TTL", "30"))
+        self._availability_checked_at = 0.0
         self.max_retries = 3  # 最大重试次数
         self.retry_delay = 1.0  # 重试延迟（秒）
         self._check_service_availability()
@@ -79,11 +82,19 @@ class RAGService:
             logger.error(f"❌ RAG服务不可用: {e}")
             logger.error(f"🔍 错误类型: {type(e).__name__}")
             logger.error(f"📋 错误详情: {str(e)}")
+        finally:
+            self._availability_checked_at = time.monotonic()
+    
+    def invalidate_availability(self):
+        """使缓存的可用性状态失效，下次调用时重新检查"""
+        self._availability_checked_at = 0.0
     
     async def _ensure_service_available(self):
-        """确保服务可用"""
-        logger.info(f"🔍 检查服务可用性状态: {self.is_available_flag}")
-        # 总是重新检查服务可用性，确保状态是最新的
+        """确保服务可用，可用性结果在availability_ttl内复用"""
+        if (self.is_available_flag is not None
+                and time.monotonic() - self._availability_checked_at < self.availability_ttl):
+            return self.is_available_flag
+        
         logger.info(f"🔄 重新检查RAG服务可用性...")
         await self._async_check_availability()
         return self.is_available_flag
@@ -148,7 +159,10 @@ class RAGService:
                     logger.error(f"❌ 所有重试尝试都失败了")
                     break
         
-        # 如果所有重试都失败了，抛出最后一个异常
+        # 如果所有重试都失败了，缓存的可用性状态不再可信
+        self.invalidate_availability()
+        
+        # 抛出最后一个异常
         if last_exception:
             raise last_exception
         else:
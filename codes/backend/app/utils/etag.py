@@ -0,0 +1,51 @@
+"""
+HTTP条件请求工具
+为只读列表接口生成弱ETag并处理If-None-Match协商
+"""
+
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response, status
+
+
+def build_etag(*parts: Any) -> str:
+    """
+    根据数据指纹生成弱ETag
+
+    Args:
+        parts: 参与计算的数据指纹，如max(updated_at)、记录数和查询参数
+
+    Returns:
+        形如 W/"<sha1>" 的弱ETag
+    """
+    fingerprint = "|".join(str(part) for part in parts)
+    return f'W/"{hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    判断请求的If-None-Match是否与当前ETag匹配（弱比较）
+
+    Args:
+        request: 当前请求
+        etag: 当前资源的ETag
+
+    Returns:
+        匹配时返回True，调用方应直接返回304
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    opaque_tag = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque_tag:
+            return True
+    return False
+
+
+def not_modified_response(etag: str) -> Response:
+    """构建304 Not Modified响应"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -71,10 +71,33 @@ CREATE TABLE IF NOT EXISTS diagnoses (
     diagnosis_result JSONB NOT NULL,
     confidence_score DECIMAL(3,2),
     risk_level VARCHAR(20), -- low, medium, high, critical
-    recommendations TEXT,
+    recommendations JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- 已有数据库：recommendations由TEXT迁移为JSONB
+-- 合法的JSON文本按JSON解析，历史的str()文本等无法解析的行保留为JSON字符串
+CREATE OR REPLACE FUNCTION text_to_jsonb_or_string(value TEXT)
+RETURNS JSONB AS $$
+BEGIN
+    RETURN value::jsonb;
+EXCEPTION WHEN invalid_text_representation THEN
+    RETURN to_jsonb(value);
+END;
+$$ language 'plpgsql' IMMUTABLE;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'diagnoses' AND column_name = 'recommendations' AND data_type = 'text'
+    ) THEN
+        ALTER TABLE diagnoses ALTER COLUMN recommendations TYPE JSONB USING text_to_jsonb_or_string(recommendations);
+    END IF;
+END $$;
+
+DROP FUNCTION text_to_jsonb_or_string(TEXT);
+
 -- 医疗知识库表
 CREATE TABLE IF NOT EXISTS medical_knowledge (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -129,17 +152,24 @@ CREATE INDEX IF NOT EXISTS idx_user_sessions_user_id ON user_sessions(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_sessions_token ON user_sessions(session_token);
 CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON conversations(user_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_status ON conversations(status);
-CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id);
+-- 覆盖索引：按对话分页读取消息时走Index Only Scan，content可能被TOAST，不放入INCLUDE
+-- 前缀列conversation_id同时满足原单列索引的查询，不再单独建立
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created ON messages(conversation_id, created_at, id) INCLUDE (role, content_type, metadata);
 CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages(user_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages(created_at);
 CREATE INDEX IF NOT EXISTS idx_diagnoses_user_id ON diagnoses(user_id);
 CREATE INDEX IF NOT EXISTS idx_diagnoses_conversation_id ON diagnoses(conversation_id);
-CREATE INDEX IF NOT EXISTS idx_medical_knowledge_category ON medical_knowledge(category);
+-- 按分类过滤并按创建时间倒序分页，复合索引可直接按序扫描，省去排序；前缀列同时满足仅按分类的查询
+CREATE INDEX IF NOT EXISTS idx_medical_knowledge_category_created ON medical_knowledge(category, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_medical_knowledge_source ON medical_knowledge(source);
 CREATE INDEX IF NOT EXISTS idx_medical_knowledge_tags ON medical_knowledge USING GIN(tags);
 CREATE INDEX IF NOT EXISTS idx_medical_knowledge_content ON medical_knowledge USING GIN(to_tsvector('english', content));
 CREATE INDEX IF NOT EXISTS idx_user_preferences_user_id ON user_preferences(user_id);
-CREATE INDEX IF NOT EXISTS idx_operation_logs_user_id ON operation_logs(user_id);
-CREATE INDEX IF NOT EXISTS idx_operation_logs_operation ON operation_logs(operation);
+-- 操作日志按用户/操作类型/资源类型过滤并按创建时间倒序分页，复合索引可直接按序扫描，省去排序；
+-- 前缀列同时满足原单列索引的查询，不再单独建立
+CREATE INDEX IF NOT EXISTS idx_operation_logs_user_created ON operation_logs(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_operation_logs_operation_created ON operation_logs(operation, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_operation_logs_resource_type_created ON operation_logs(resource_type, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_operation_logs_created_at ON operation_logs(created_at);
 
 -- 创建触发器函数用于自动更新updated_at字段
@@ -159,6 +189,28 @@ CREATE TRIGGER update_medical_knowledge_updated_at BEFORE UPDATE ON medical_know
 CREATE TRIGGER update_user_preferences_updated_at BEFORE UPDATE ON user_preferences FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_system_configs_updated_at BEFORE UPDATE ON system_configs FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- 对话消息数反范式字段：由触发器在消息写入/删除的同一事务内维护，列表接口无需再聚合messages
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+
+-- 只回填计数不一致的行，避免重复执行时无谓地触发updated_at触发器
+UPDATE conversations c
+SET message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id)
+WHERE c.message_count IS DISTINCT FROM (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id);
+
+CREATE OR REPLACE FUNCTION update_conversation_message_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE conversations SET message_count = message_count + 1 WHERE id = NEW.conversation_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE conversations SET message_count = message_count - 1 WHERE id = OLD.conversation_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER update_conversations_message_count AFTER INSERT OR DELETE ON messages FOR EACH ROW EXECUTE FUNCTION update_conversation_message_count();
+
 -- 插入初始系统配置
 INSERT INTO system_configs (config_key, config_value, description) VALUES
 ('ai_models', '{"default_llm": "gpt-4", "default_embedding": "openai", "default_voice": "whisper"}', 'AI模型配置'),
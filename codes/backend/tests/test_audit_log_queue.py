@@ -0,0 +1,211 @@
+"""
+操作日志写缓冲队列测试
+使用内存中的Redis替身和SQLite会话，覆盖逐条回退、死信和数据库不可用时重新入队三条路径
+"""
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import Column, DateTime, String, Uuid, create_engine, event, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.services import audit_log_queue
+from app.services.audit_log_queue import (
+    AUDIT_DEAD_LETTER_KEY,
+    AUDIT_PROCESSING_KEY,
+    AUDIT_QUEUE_KEY,
+    enqueue_operation_log,
+    flush_operation_logs,
+    recover_processing_logs,
+)
+
+Base = declarative_base()
+
+
+class OperationLog(Base):
+    """测试用的操作日志表，action不允许为空，用来构造无法写入的日志"""
+    __tablename__ = "operation_logs"
+
+    id = Column(Uuid, primary_key=True)
+    action = Column(String(50), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class FakePipeline:
+    """按顺序记录命令，execute时依次在FakeRedis上执行"""
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self._commands.append((name, args))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self._redis, name)(*args) for name, args in self._commands]
+        self._commands = []
+        return results
+
+
+class FakeRedis:
+    """只实现写缓冲队列用到的列表命令"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def _list(self, key):
+        return self.lists.setdefault(key, [])
+
+    def lpush(self, key, *values):
+        items = self._list(key)
+        for value in values:
+            items.insert(0, value)
+        return len(items)
+
+    def rpush(self, key, *values):
+        items = self._list(key)
+        items.extend(values)
+        return len(items)
+
+    def llen(self, key):
+        return len(self._list(key))
+
+    def lrange(self, key, start, end):
+        items = self._list(key)
+        end = len(items) if end == -1 else end + 1
+        return items[start:end]
+
+    def lrem(self, key, count, value):
+        items = self._list(key)
+        removed = 0
+        while value in items and removed < count:
+            items.remove(value)
+            removed += 1
+        return removed
+
+    def lmove(self, source, destination, src="LEFT", dest="RIGHT"):
+        items = self._list(source)
+        if not items:
+            return None
+        value = items.pop(0 if src == "LEFT" else -1)
+        if dest == "LEFT":
+            self._list(destination).insert(0, value)
+        else:
+            self._list(destination).append(value)
+        return value
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(audit_log_queue, "redis_client", redis)
+    return redis
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+    # pysqlite默认自行管理事务，需要交给SQLAlchemy才能正确使用SAVEPOINT
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, expire_on_commit=False)
+
+    @contextmanager
+    def get_db_context():
+        db = factory()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(audit_log_queue, "OperationLog", OperationLog)
+    monkeypatch.setattr(audit_log_queue, "get_db_context", get_db_context)
+    yield factory
+    engine.dispose()
+
+
+def _enqueue(*actions):
+    return [enqueue_operation_log({"action": action}) for action in actions]
+
+
+def _stored_ids(factory):
+    with factory() as db:
+        return set(db.scalars(select(OperationLog.id)))
+
+
+def test_batch_failure_falls_back_to_savepoints(fake_redis, session_factory):
+    """批内有一条无法写入时，其余日志逐条写入成功"""
+    logs = _enqueue("login", None, "logout")
+
+    assert flush_operation_logs() == 2
+    assert _stored_ids(session_factory) == {logs[0]["id"], logs[2]["id"]}
+    assert fake_redis.llen(AUDIT_QUEUE_KEY) == 0
+    assert fake_redis.llen(AUDIT_PROCESSING_KEY) == 0
+
+
+def test_unwritable_log_is_dead_lettered(fake_redis, session_factory):
+    """无法写入的日志移入死信队列，不留在主队列或处理中列表"""
+    logs = _enqueue("login", None)
+
+    flush_operation_logs()
+
+    dead_letters = fake_redis.lrange(AUDIT_DEAD_LETTER_KEY, 0, -1)
+    assert len(dead_letters) == 1
+    assert str(logs[1]["id"]) in dead_letters[0]
+    assert fake_redis.llen(AUDIT_QUEUE_KEY) == 0
+    assert fake_redis.llen(AUDIT_PROCESSING_KEY) == 0
+
+
+def test_database_unavailable_requeues_in_original_order(fake_redis, session_factory, monkeypatch):
+    """数据库不可用时整批按原顺序放回队列，处理中列表不留残余"""
+    _enqueue("login", "view", "logout")
+    queued = fake_redis.lrange(AUDIT_QUEUE_KEY, 0, -1)
+
+    @contextmanager
+    def unavailable_db_context():
+        raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+        yield
+
+    monkeypatch.setattr(audit_log_queue, "get_db_context", unavailable_db_context)
+
+    with pytest.raises(OperationalError):
+        flush_operation_logs(batch_size=2)
+
+    assert fake_redis.lrange(AUDIT_QUEUE_KEY, 0, -1) == queued
+    assert fake_redis.llen(AUDIT_PROCESSING_KEY) == 0
+
+
+def test_recover_processing_logs_restores_order(fake_redis, session_factory):
+    """进程在写入途中退出后，残留在处理中列表的日志按原顺序放回队列"""
+    _enqueue("login", "view", "logout")
+    queued = fake_redis.lrange(AUDIT_QUEUE_KEY, 0, -1)
+
+    audit_log_queue._pop_batch(2)
+
+    assert recover_processing_logs() == 2
+    assert fake_redis.lrange(AUDIT_QUEUE_KEY, 0, -1) == queued
+    assert fake_redis.llen(AUDIT_PROCESSING_KEY) == 0